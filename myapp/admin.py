@@ -3,7 +3,8 @@ from django.contrib.auth.admin import UserAdmin
 from .models import (
     CustomUser, Customer, PaymentRecord, CustomerItem, 
     Transaction, MonthlyStatement, CustomerHistory, 
-    UserPermission, UserActivityLog
+    UserPermission, UserActivityLog, CustomerLedger, ItemLedger, TransactionSequence, DailyCollection,
+    ArchivedCustomerItem, ArchivedPaymentRecord
 )
 
 @admin.register(CustomUser)
@@ -96,3 +97,40 @@ class UserActivityLogAdmin(admin.ModelAdmin):
     search_fields = ('user__username', 'action', 'description')
     readonly_fields = ('timestamp',)
     ordering = ('-timestamp',)
+
+@admin.register(CustomerLedger)
+class CustomerLedgerAdmin(admin.ModelAdmin):
+    list_display = ('customer', 'total_paid', 'total_rebates', 'payment_count', 'last_payment_date', 'months_covered', 'remaining_balance')
+    search_fields = ('customer__customers_name',)
+    readonly_fields = ('updated_at',)
+
+@admin.register(ItemLedger)
+class ItemLedgerAdmin(admin.ModelAdmin):
+    list_display = ('item', 'total_paid', 'total_rebates', 'payment_count', 'last_payment_date', 'months_covered', 'remaining_balance')
+    search_fields = ('item__item_name', 'item__customer__customers_name')
+    readonly_fields = ('updated_at',)
+
+@admin.register(TransactionSequence)
+class TransactionSequenceAdmin(admin.ModelAdmin):
+    list_display = ('year_month', 'last_number', 'updated_at')
+    ordering = ('-year_month',)
+    readonly_fields = ('updated_at',)
+
+@admin.register(DailyCollection)
+class DailyCollectionAdmin(admin.ModelAdmin):
+    list_display = ('collection_date', 'payment_method', 'recorded_by', 'payment_count', 'total_amount', 'total_rebates')
+    list_filter = ('payment_method', 'collection_date')
+    ordering = ('-collection_date',)
+    readonly_fields = ('updated_at',)
+
+@admin.register(ArchivedCustomerItem)
+class ArchivedCustomerItemAdmin(admin.ModelAdmin):
+    list_display = ('customer', 'item_name', 'item_model', 'total_contract_amount', 'status', 'purchase_date')
+    search_fields = ('customer__customers_name', 'item_name', 'item_model')
+
+@admin.register(ArchivedPaymentRecord)
+class ArchivedPaymentRecordAdmin(admin.ModelAdmin):
+    list_display = ('customer', 'payment_number', 'payment_date', 'amount_paid', 'payment_method', 'transaction_number')
+    list_filter = ('payment_method', 'payment_date')
+    search_fields = ('customer__customers_name', 'transaction_number')
+    ordering = ('-payment_date',)
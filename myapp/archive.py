@@ -0,0 +1,141 @@
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import (
+    ArchivedCustomerItem, ArchivedPaymentRecord, Customer, CustomerItem, CustomerSearchEntry, ItemLedger,
+    PaymentRecord,
+)
+from .summaries import invalidate_customer_summary
+
+ARCHIVE_BATCH_SIZE = 200  # customers moved per transaction
+ARCHIVED_STATUSES = ('fully_paid', 'pulled_out')
+
+
+def _copy_rows(source, target, customer_ids):
+    """INSERT INTO target ... SELECT the customers' rows from source - the rows never leave the database"""
+    fields = target._meta.concrete_fields
+    attnames = [field.attname for field in fields]
+    if set(attnames) != {field.attname for field in source._meta.concrete_fields}:
+        raise RuntimeError(f'{target.__name__} no longer mirrors {source.__name__}')
+    select_sql, params = (
+        source.objects.filter(customer_id__in=customer_ids).order_by().values_list(*attnames).query.sql_with_params()
+    )
+    table = connection.ops.quote_name(target._meta.db_table)
+    columns = ', '.join(connection.ops.quote_name(field.column) for field in fields)
+    with connection.cursor() as cursor:
+        cursor.execute(f'INSERT INTO {table} ({columns}) {select_sql}', params)
+        return cursor.rowcount
+
+
+def _delete_rows(queryset):
+    """DELETE the queryset's rows with plain SQL, like _copy_rows() inserts them.
+
+    The rows were moved, not deleted, so the delete signals (collection rollup, report
+    invalidation) and the ORM's cascade collection must not run.
+    """
+    model = queryset.model
+    select_sql, params = queryset.order_by().values('pk').query.sql_with_params()
+    table = connection.ops.quote_name(model._meta.db_table)
+    pk = connection.ops.quote_name(model._meta.pk.column)
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {table} WHERE {pk} IN ({select_sql})', params)
+        return cursor.rowcount
+
+
+def closed_customers(closed_before=None):
+    """Closed contracts whose items or payments are still in the live tables"""
+    customers = Customer.objects.filter(status__in=ARCHIVED_STATUSES).filter(
+        Q(id__in=PaymentRecord.objects.values('customer_id')) | Q(id__in=CustomerItem.objects.values('customer_id'))
+    )
+    if closed_before:
+        customers = customers.filter(completion_date__lt=closed_before)
+    return customers
+
+
+def archive_customers(customer_ids):
+    """Move the items and payments of these (closed) customers to the archive tables.
+
+    The customer, ledger and history rows stay; the item ledgers go with their items and
+    restore_customer() rebuilds them. Returns (items moved, payments moved).
+    """
+    customer_ids = list(customer_ids)
+    with transaction.atomic():
+        # Re-check under the lock so a customer reactivated meanwhile stays live
+        customer_ids = list(
+            Customer.objects.select_for_update().filter(id__in=customer_ids, status__in=ARCHIVED_STATUSES)
+            .values_list('id', flat=True)
+        )
+        if not customer_ids:
+            return 0, 0
+        # Items first - the archived payments point at the archived items
+        item_count = _copy_rows(CustomerItem, ArchivedCustomerItem, customer_ids)
+        payment_count = _copy_rows(PaymentRecord, ArchivedPaymentRecord, customer_ids)
+        _delete_rows(PaymentRecord.objects.filter(customer_id__in=customer_ids))
+        _delete_rows(ItemLedger.objects.filter(item__customer_id__in=customer_ids))
+        _delete_rows(CustomerItem.objects.filter(customer_id__in=customer_ids))
+    invalidate_customer_summary(*customer_ids)
+    return item_count, payment_count
+
+
+def archive_closed_contracts(closed_before=None, batch_size=ARCHIVE_BATCH_SIZE):
+    """archive_customers() over every closed contract, `batch_size` customers per transaction.
+
+    `closed_before` keeps recently closed contracts live (e.g. for late corrections).
+    Returns (customers, items, payments) moved.
+    """
+    totals = [0, 0, 0]
+    while True:
+        batch = list(closed_customers(closed_before).order_by('id').values_list('id', flat=True)[:batch_size])
+        if not batch:
+            return tuple(totals)
+        item_count, payment_count = archive_customers(batch)
+        if not (item_count or payment_count):
+            return tuple(totals)
+        totals[0] += len(batch)
+        totals[1] += item_count
+        totals[2] += payment_count
+
+
+def archive_cutoff(days):
+    """closed_before for contracts closed at least `days` ago"""
+    return timezone.localdate() - timedelta(days=days)
+
+
+def has_archived_rows(customer_id):
+    return Customer.objects.filter(
+        Q(archived_items__isnull=False) | Q(archived_payments__isnull=False), id=customer_id
+    ).exists()
+
+
+def restore_customer(customer_id):
+    """Move a customer's archived items and payments back to the live tables.
+
+    Called when customer_history restores a customer (any reactivation, via the Customer
+    post_save signal). Returns (items moved, payments moved) - (0, 0) if nothing was archived.
+    """
+    if not has_archived_rows(customer_id):
+        return 0, 0
+    with transaction.atomic():
+        # A number typed in by hand after the archiving may have taken an archived one
+        clashes = ArchivedPaymentRecord.objects.filter(
+            customer_id=customer_id, transaction_number__in=PaymentRecord.objects.values('transaction_number')
+        )
+        for payment_id, payment_date in clashes.values_list('id', 'payment_date'):
+            ArchivedPaymentRecord.objects.filter(id=payment_id).update(
+                transaction_number=PaymentRecord.next_transaction_number(payment_date)
+            )
+        item_count = _copy_rows(ArchivedCustomerItem, CustomerItem, [customer_id])
+        payment_count = _copy_rows(ArchivedPaymentRecord, PaymentRecord, [customer_id])
+        _delete_rows(ArchivedPaymentRecord.objects.filter(customer_id=customer_id))
+        _delete_rows(ArchivedCustomerItem.objects.filter(customer_id=customer_id))
+        for item in CustomerItem.objects.filter(customer_id=customer_id).select_related('customer'):
+            ItemLedger.refresh_for(item)
+        customer = Customer.objects.filter(id=customer_id).first()
+        if customer:
+            # The search entry lists the item names, which were archived until now
+            CustomerSearchEntry.refresh_for(customer)
+    invalidate_customer_summary(customer_id)
+    return item_count, payment_count
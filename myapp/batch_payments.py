@@ -0,0 +1,203 @@
+import csv
+import io
+import json
+from collections import defaultdict
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import (
+    Customer, CustomerItem, CustomerLedger, DailyCollection, ItemLedger, PaymentRecord, TransactionSequence
+)
+from .reports import invalidate_reports
+from .summaries import invalidate_customer_summary
+
+MAX_BATCH_ROWS = 500
+
+# Columns of a CSV upload / keys of a JSON payment object
+BATCH_COLUMNS = ('customer_id', 'customer_item_id', 'payment_date', 'amount_paid', 'payment_method', 'rebate_amount', 'notes')
+REQUIRED_COLUMNS = ('customer_id', 'amount_paid', 'notes')
+
+
+class BatchError(ValueError):
+    """The upload as a whole cannot be processed"""
+
+
+def parse_batch(request):
+    """Rows of an upload - a JSON body ({"payments": [...]} or a bare list) or a CSV file in `file`"""
+    if request.content_type == 'application/json':
+        try:
+            data = json.loads(request.body or b'null')
+        except ValueError:
+            raise BatchError('Invalid JSON body')
+        rows = data.get('payments') if isinstance(data, dict) else data
+        if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+            raise BatchError('Expected a list of payment objects')
+        return rows
+
+    upload = request.FILES.get('file')
+    if upload is None:
+        raise BatchError('Send a JSON body or upload a CSV file')
+    try:
+        text = upload.read().decode('utf-8-sig')
+    except UnicodeDecodeError:
+        raise BatchError('The CSV file must be UTF-8 encoded')
+    reader = csv.DictReader(io.StringIO(text))
+    if not set(REQUIRED_COLUMNS) <= set(reader.fieldnames or []):
+        raise BatchError(f"The CSV header must name the columns: {', '.join(BATCH_COLUMNS)}")
+    return list(reader)
+
+
+def _text(row, key):
+    value = row.get(key)
+    return '' if value is None else str(value).strip()
+
+
+def _to_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _to_decimal(value):
+    try:
+        return Decimal(value).quantize(Decimal('0.01'))
+    except (InvalidOperation, TypeError, ValueError):
+        return None
+
+
+def validate_batch(rows):
+    """Check every row before anything is written - returns (unsaved payments, per-row errors)"""
+    if not rows:
+        raise BatchError('The upload contains no payments')
+    if len(rows) > MAX_BATCH_ROWS:
+        raise BatchError(f'At most {MAX_BATCH_ROWS} payments can be recorded per upload')
+
+    # Two queries for the whole batch instead of two per row
+    customers = Customer.objects.in_bulk(
+        {_to_int(_text(row, 'customer_id')) for row in rows} - {None}
+    )
+    items = CustomerItem.objects.in_bulk(
+        {_to_int(_text(row, 'customer_item_id')) for row in rows} - {None}
+    )
+
+    payments = []
+    errors = []
+    for row_number, row in enumerate(rows, start=1):
+        row_errors = []
+
+        customer = customers.get(_to_int(_text(row, 'customer_id')))
+        if customer is None:
+            row_errors.append('Customer not found')
+
+        item = None
+        if _text(row, 'customer_item_id'):
+            item = items.get(_to_int(_text(row, 'customer_item_id')))
+            if item is None or (customer is not None and item.customer_id != customer.id):
+                row_errors.append('Item not found for this customer')
+
+        amount_paid = _to_decimal(_text(row, 'amount_paid'))
+        if amount_paid is None or amount_paid <= 0:
+            row_errors.append('Amount paid must be a positive number')
+
+        rebate_amount = Decimal('0.00')
+        if _text(row, 'rebate_amount'):
+            rebate_amount = _to_decimal(_text(row, 'rebate_amount'))
+            if rebate_amount is None or rebate_amount < 0:
+                row_errors.append('Rebate amount must be zero or a positive number')
+
+        payment_date = date.today()
+        if _text(row, 'payment_date'):
+            try:
+                payment_date = datetime.strptime(_text(row, 'payment_date'), '%Y-%m-%d').date()
+            except ValueError:
+                row_errors.append('Payment date must be in YYYY-MM-DD format')
+
+        notes = _text(row, 'notes')
+        if not notes:
+            row_errors.append('Notes are required for every payment')
+
+        if row_errors:
+            errors.append({'row': row_number, 'errors': row_errors})
+            continue
+
+        payments.append(PaymentRecord(
+            customer=customer,
+            customer_item=item,
+            payment_date=payment_date,
+            amount_paid=amount_paid,
+            payment_method=_text(row, 'payment_method') or 'Cash',
+            has_rebate=rebate_amount > 0,
+            rebate_amount=rebate_amount,
+            notes=notes,
+        ))
+    return payments, errors
+
+
+def _assign_transaction_numbers(payments):
+    """One block of numbers per month, skipping numbers already held (typed in by hand, or archived)"""
+    by_month = defaultdict(list)
+    for payment in payments:
+        by_month[payment.payment_date.strftime('%Y-%m')].append(payment)
+
+    for year_month, pending in by_month.items():
+        while pending:
+            numbers = TransactionSequence.allocate_block(year_month, len(pending))
+            taken = PaymentRecord.taken_transaction_numbers(numbers)
+            unassigned = []
+            for payment, number in zip(pending, numbers):
+                if number in taken:
+                    unassigned.append(payment)
+                else:
+                    payment.transaction_number = number
+            pending = unassigned
+
+
+def record_batch(payments, recorded_by=None):
+    """Insert validated payments and update each touched customer/item once - returns the customers"""
+    customers = {payment.customer_id: payment.customer for payment in payments}
+    items = {payment.customer_item_id: payment.customer_item for payment in payments if payment.customer_item_id}
+
+    with transaction.atomic():
+        # Lock the ledgers first, exactly like PaymentRecord.save() does for a single payment
+        ledgers = CustomerLedger.locked_for_many(list(customers.values()))
+        item_ledgers = ItemLedger.locked_for_many(list(items.values()))
+
+        _assign_transaction_numbers(payments)
+
+        amounts = defaultdict(Decimal)
+        for payment in payments:
+            ledger = ledgers[payment.customer_id]
+            payment.recorded_by = recorded_by
+            payment.payment_number = ledger.last_payment_number + 1
+            ledger.add_payment(payment)
+            if payment.customer_item_id:
+                item_ledgers[payment.customer_item_id].add_payment(payment)
+            amounts[payment.customer_id] += payment.amount_paid
+
+        PaymentRecord.objects.bulk_create(payments, batch_size=500)
+        DailyCollection.add_payments(payments)
+
+        for customer_id, amount in amounts.items():
+            Customer.objects.filter(pk=customer_id).update(payments=F('payments') + amount)
+
+        # bulk_update() does not touch auto_now fields
+        now = timezone.now()
+        for customer_id, ledger in ledgers.items():
+            ledger.apply_terms(customers[customer_id])
+            ledger.updated_at = now
+            customers[customer_id].payments = ledger.total_paid
+        for item_id, ledger in item_ledgers.items():
+            ledger.apply_terms(items[item_id])
+            ledger.updated_at = now
+        CustomerLedger.objects.bulk_update(ledgers.values(), CustomerLedger.PAYMENT_FIELDS)
+        ItemLedger.objects.bulk_update(item_ledgers.values(), ItemLedger.PAYMENT_FIELDS)
+        # bulk_create() sends no post_save signals
+        invalidate_customer_summary(*customers)
+        invalidate_reports(*{payment.payment_date for payment in payments})
+
+    return list(customers.values())
@@ -0,0 +1,147 @@
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.db.models import (
+    Case, Count, DateField, DecimalField, ExpressionWrapper, F, IntegerField, Q, Sum, Value, When
+)
+from django.db.models.functions import Coalesce, Greatest
+
+from .db_functions import DaysBetween
+from .models import Customer, DailyCollection, PaymentRecord
+from .periods import month_filter
+
+OVERDUE_LIST_SIZE = 10
+RECENT_PAYMENTS_SIZE = 10
+RECENT_CUSTOMERS_SIZE = 5
+PRIORITY_LIST_SIZE = 10
+STAFF_DUE_SOON_DAYS = 7
+
+
+def _still_paying():
+    """Customers with a next due date (Customer.next_due_date is None once the term is paid)"""
+    return Q(ledger__next_due_date__isnull=False, ledger__payment_count__lt=F('term'))
+
+
+def admin_dashboard_stats(today=None):
+    """Admin dashboard figures in a fixed number of queries (5), whatever the customer count"""
+    today = today or date.today()
+    month_start = today.replace(day=1)
+    still_paying = _still_paying()
+    due_today = still_paying & Q(ledger__next_due_date=today)
+    overdue = still_paying & Q(ledger__next_due_date__lt=today)
+
+    active = Customer.objects.filter(status='active')
+    customer_stats = active.aggregate(
+        total_customers=Count('id'),
+        payments_due_today=Count('id', filter=due_today),
+        overdue_count=Count('id', filter=overdue),
+    )
+
+    # Today's figures are a subset of the month window, so one scan of the rollup covers both
+    collection_stats = DailyCollection.objects.filter(
+        collection_date__gte=month_start,
+        collection_date__lte=today
+    ).aggregate(
+        month_revenue=Sum('total_amount'),
+        today_collections=Sum('total_amount', filter=Q(collection_date=today)),
+        today_payment_count=Sum('payment_count', filter=Q(collection_date=today)),
+    )
+
+    overdue_customers = list(
+        active.filter(overdue).select_related('ledger').order_by('id')[:OVERDUE_LIST_SIZE]
+    )
+    recent_payments = list(
+        PaymentRecord.objects.select_related('customer').order_by('-created_at')[:RECENT_PAYMENTS_SIZE]
+    )
+    recent_customers = list(Customer.objects.order_by('-created_at')[:RECENT_CUSTOMERS_SIZE])
+
+    return {
+        'total_customers': customer_stats['total_customers'],
+        'payments_due_today': customer_stats['payments_due_today'],
+        'today_collections': collection_stats['today_collections'] or Decimal('0.00'),
+        'today_payment_count': collection_stats['today_payment_count'] or 0,
+        'month_revenue': collection_stats['month_revenue'] or Decimal('0.00'),
+        'overdue_count': customer_stats['overdue_count'],
+        'overdue_customers': overdue_customers,
+        'recent_payments': recent_payments,
+        'recent_customers': recent_customers,
+    }
+
+
+def staff_collection_customers(today=None):
+    """Customers still paying, annotated with the staff dashboard's 30-day priority figures"""
+    today = today or date.today()
+    money = DecimalField(max_digits=12, decimal_places=2)
+
+    return Customer.objects.filter(
+        Q(status='active') | Q(status__isnull=True),
+        date_delivered__isnull=False,
+    ).annotate(
+        payments_made=Coalesce('ledger__payment_count', 0),
+        total_paid_amount=Coalesce('ledger__total_paid', Value(Decimal('0.00')), output_field=money),
+        days_since_delivery=DaysBetween(Value(today, output_field=DateField()), F('date_delivered')),
+    ).filter(
+        payments_made__lt=F('term')
+    ).annotate(
+        # One payment expected every 30 days from delivery; nothing is owed before delivery
+        expected_payments=Case(
+            When(days_since_delivery__lt=0, then=Value(0)),
+            default=ExpressionWrapper(F('days_since_delivery') / 30 + 1, output_field=IntegerField()),
+            output_field=IntegerField(),
+        ),
+        # The next due date is delivery + 30 * (payments_made + 1) days
+        days_overdue=Greatest(
+            F('days_since_delivery') - (F('payments_made') + 1) * 30, Value(0), output_field=IntegerField()
+        ),
+    ).annotate(
+        overdue_payments=Greatest(F('expected_payments') - F('payments_made'), Value(0)),
+    )
+
+
+def staff_priority_stats(queryset):
+    """Overdue and due-soon counts for the staff dashboard from one aggregate"""
+    return queryset.aggregate(
+        overdue_count=Count('id', filter=Q(overdue_payments__gt=0)),
+        due_soon_count=Count('id', filter=Q(overdue_payments=0, days_overdue__lte=STAFF_DUE_SOON_DAYS)),
+    )
+
+
+def staff_priority_rows(queryset, limit=PRIORITY_LIST_SIZE):
+    """The `limit` most overdue customers, sorted and cut in SQL, shaped for the template"""
+    customers = queryset.filter(overdue_payments__gt=0).order_by(
+        '-overdue_payments', '-days_overdue', 'id'
+    )[:limit]
+
+    rows = []
+    for customer in customers:
+        total_contract = customer.monthly_due * customer.term
+        rows.append({
+            'customer': customer,
+            'payments_made': customer.payments_made,
+            'expected_payments': customer.expected_payments,
+            'overdue_payments': customer.overdue_payments,
+            'next_due_date': customer.date_delivered + timedelta(days=30 * (customer.payments_made + 1)),
+            'days_overdue': customer.days_overdue,
+            'balance': total_contract - customer.total_paid_amount,
+            'total_contract': total_contract,
+            'total_paid': customer.total_paid_amount,
+        })
+    return rows
+
+
+def collection_totals(today=None):
+    """Today's and this calendar month's collections (amount and count) in one aggregate of the rollup"""
+    today = today or date.today()
+    totals = DailyCollection.objects.filter(
+        **month_filter('collection_date', today.year, today.month)
+    ).aggregate(
+        month_collections=Sum('total_amount'),
+        month_payment_count=Sum('payment_count'),
+        today_collections=Sum('total_amount', filter=Q(collection_date=today)),
+        today_payment_count=Sum('payment_count', filter=Q(collection_date=today)),
+    )
+    totals['month_collections'] = totals['month_collections'] or Decimal('0.00')
+    totals['month_payment_count'] = totals['month_payment_count'] or 0
+    totals['today_collections'] = totals['today_collections'] or Decimal('0.00')
+    totals['today_payment_count'] = totals['today_payment_count'] or 0
+    return totals
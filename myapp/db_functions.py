@@ -0,0 +1,21 @@
+from django.db.models import Func, IntegerField
+
+
+class DaysBetween(Func):
+    """Whole days from `start` to `end` (end - start) as an integer - SQLite and PostgreSQL"""
+    arity = 2
+    template = '(%(expressions)s)'
+    arg_joiner = ' - '
+    output_field = IntegerField()
+
+    def __init__(self, end, start, **extra):
+        super().__init__(end, start, **extra)
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        # julianday() of two dates differs by a whole number of days
+        return self.as_sql(
+            compiler, connection,
+            template='CAST(julianday(%(expressions)s) AS INTEGER)',
+            arg_joiner=') - julianday(',
+            **extra_context
+        )
@@ -0,0 +1,105 @@
+from datetime import date
+from decimal import Decimal
+
+from django.db.models import (
+    Case, Count, DateField, DecimalField, ExpressionWrapper, F, IntegerField, Q, Sum, Value, When
+)
+from django.db.models.functions import Coalesce, Greatest
+
+from .db_functions import DaysBetween
+from .models import Customer
+
+DUE_SOON_DAYS = 7
+
+STATUS_DISPLAY = {
+    'overdue': ('status-overdue', 'Overdue'),
+    'due_soon': ('status-due-soon', 'Due Soon'),
+    'current': ('status-current', 'Current'),
+}
+
+
+def classified_customers(today=None):
+    """Active customers annotated with their due status (same rules as the original PHP report)"""
+    today = today or date.today()
+    today_value = Value(today, output_field=DateField())
+    money = DecimalField(max_digits=12, decimal_places=2)
+
+    return Customer.objects.filter(
+        status='active',
+        date_delivered__isnull=False,
+        monthly_due__isnull=False,
+    ).exclude(monthly_due=0).annotate(
+        payments_made=Coalesce('ledger__payment_count', 0),
+        total_paid_amount=Coalesce('ledger__total_paid', Value(Decimal('0.00')), output_field=money),
+        next_due=F('ledger__next_due_date'),
+        days_since_delivery=DaysBetween(today_value, F('date_delivered')),
+        days_until_due=DaysBetween(F('ledger__next_due_date'), today_value),
+    ).annotate(
+        # One expected payment every 30 days, the first on delivery
+        expected_payments=Case(
+            When(days_since_delivery__lt=0, then=Value(0)),
+            default=ExpressionWrapper(F('days_since_delivery') / 30 + 1, output_field=IntegerField()),
+            output_field=IntegerField(),
+        ),
+    ).annotate(
+        overdue_payments=Greatest(F('expected_payments') - F('payments_made'), Value(0)),
+        days_overdue=Case(
+            When(days_until_due__lt=0, then=-F('days_until_due')),
+            default=Value(0),
+            output_field=IntegerField(),
+        ),
+        due_status=Case(
+            When(days_until_due__lt=0, then=Value('overdue')),
+            When(days_until_due__lte=DUE_SOON_DAYS, then=Value('due_soon')),
+            default=Value('current'),
+        ),
+        remaining=ExpressionWrapper(
+            F('monthly_due') * F('term') - F('total_paid_amount'), output_field=money
+        ),
+    )
+
+
+def due_payment_stats(queryset):
+    """Report header figures for the whole book in a single aggregate"""
+    money = DecimalField(max_digits=14, decimal_places=2)
+    stats = queryset.aggregate(
+        total_customers=Count('id'),
+        overdue_customers=Count('id', filter=Q(due_status='overdue')),
+        due_soon_customers=Count('id', filter=Q(due_status='due_soon')),
+        current_customers=Count('id', filter=Q(due_status='current')),
+        total_overdue_amount=Sum(
+            ExpressionWrapper(F('monthly_due') * F('overdue_payments'), output_field=money),
+            filter=Q(due_status='overdue'),
+        ),
+    )
+    stats['total_overdue_amount'] = stats['total_overdue_amount'] or 0
+    return stats
+
+
+def filter_by_status(queryset, status):
+    """Apply the report's status filter ('all' keeps everyone) and its sort order"""
+    if status in STATUS_DISPLAY:
+        queryset = queryset.filter(due_status=status)
+    return queryset.order_by('-overdue_payments', '-days_overdue', 'id')
+
+
+def as_report_rows(customers):
+    """Shape annotated customers like the rows the due_payments template expects"""
+    rows = []
+    for customer in customers:
+        status_class, status_text = STATUS_DISPLAY[customer.due_status]
+        rows.append({
+            'customer': customer,
+            'payments_made': customer.payments_made,
+            'expected_payments': customer.expected_payments,
+            'overdue_payments': customer.overdue_payments,
+            'next_due_date': customer.next_due,
+            'days_overdue': customer.days_overdue,
+            'days_until_due': customer.days_until_due,
+            'balance': customer.remaining,
+            'status': customer.due_status,
+            'status_class': status_class,
+            'status_text': status_text,
+            'total_paid': customer.total_paid_amount,
+        })
+    return rows
@@ -0,0 +1,83 @@
+from datetime import datetime
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db.models import Count, Q, Sum
+
+from .models import CustomerHistory
+from .pagination import keyset_page
+from .versioning import bump_versions, current_version
+
+HISTORY_PAGE_SIZE = 25
+HISTORY_STATS_CACHE_SECONDS = 60 * 60 * 24
+HISTORY_STATUSES = ('fully_paid', 'pulled_out')
+# Newest completion first; the id settles rows completed the same day (history_status_completed_idx)
+HISTORY_ORDERING = ('-completion_date', '-id')
+
+STATS_VERSION_KEY = 'customer-history-stats-version'
+
+
+def _parse_date(value):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except (TypeError, ValueError):
+        return None
+
+
+def history_filters(params):
+    """The name/transaction/date filters of a request's GET parameters, cleaned"""
+    return {
+        'q': (params.get('q') or '').strip(),
+        'transaction': (params.get('transaction') or '').strip(),
+        'date_from': _parse_date(params.get('date_from')),
+        'date_to': _parse_date(params.get('date_to')),
+    }
+
+
+def filter_history(queryset, filters):
+    # The prefix matches are served by the indexes migration 0020 installs
+    if filters['q']:
+        queryset = queryset.filter(customers_name__istartswith=filters['q'])
+    if filters['transaction']:
+        queryset = queryset.filter(transaction_number__istartswith=filters['transaction'])
+    if filters['date_from']:
+        queryset = queryset.filter(completion_date__gte=filters['date_from'])
+    if filters['date_to']:
+        queryset = queryset.filter(completion_date__lte=filters['date_to'])
+    return queryset
+
+
+def history_page(final_status, filters, cursor=None, page_size=HISTORY_PAGE_SIZE):
+    """One keyset page of a status's history rows - raises ValueError for a bad cursor"""
+    queryset = filter_history(
+        CustomerHistory.objects.filter(final_status=final_status).select_related('completed_by'), filters
+    )
+    return keyset_page(queryset, cursor, page_size=page_size, ordering=HISTORY_ORDERING)
+
+
+def build_history_stats():
+    """Count and amount collected per final status (one aggregate over the whole archive)"""
+    stats = CustomerHistory.objects.aggregate(
+        fully_paid_count=Count('id', filter=Q(final_status='fully_paid')),
+        pulled_out_count=Count('id', filter=Q(final_status='pulled_out')),
+        fully_paid_total=Sum('total_payments', filter=Q(final_status='fully_paid')),
+        pulled_out_total=Sum('total_payments', filter=Q(final_status='pulled_out')),
+    )
+    stats['fully_paid_total'] = stats['fully_paid_total'] or Decimal('0.00')
+    stats['pulled_out_total'] = stats['pulled_out_total'] or Decimal('0.00')
+    return stats
+
+
+def history_stats():
+    """build_history_stats() through the cache - rebuilt only after a history row changed"""
+    key = f'customer-history-stats:{current_version(STATS_VERSION_KEY)}'
+    stats = cache.get(key)
+    if stats is None:
+        stats = build_history_stats()
+        cache.set(key, stats, HISTORY_STATS_CACHE_SECONDS)
+    return stats
+
+
+def invalidate_history_stats():
+    """Retire the cached stats"""
+    bump_versions([STATS_VERSION_KEY])
@@ -0,0 +1,85 @@
+from django.core.management.base import BaseCommand
+from myapp.archive import (
+    ARCHIVE_BATCH_SIZE, ARCHIVED_STATUSES, archive_closed_contracts, archive_customers, archive_cutoff,
+    restore_customer,
+)
+from myapp.models import Customer
+
+class Command(BaseCommand):
+    help = (
+        'Move the items and payments of closed (fully paid / pulled out) contracts to the archive '
+        'tables, in batches. Run it periodically (e.g. nightly from cron).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--older-than',
+            type=int,
+            default=30,
+            help='Only archive contracts closed at least this many days ago (default: 30)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=ARCHIVE_BATCH_SIZE,
+            help=f'Customers moved per transaction (default: {ARCHIVE_BATCH_SIZE})'
+        )
+        parser.add_argument(
+            '--customer',
+            type=int,
+            help='Only archive this customer ID (regardless of when it was closed)'
+        )
+        parser.add_argument(
+            '--restore',
+            type=int,
+            metavar='CUSTOMER',
+            help='Move this customer ID\'s archived items and payments back instead'
+        )
+
+    def get_customer(self, customer_id):
+        customer = Customer.objects.filter(id=customer_id).first()
+        if customer is None:
+            self.stdout.write(
+                self.style.ERROR(f'Customer {customer_id} not found')
+            )
+        return customer
+
+    def handle(self, *args, **options):
+        if options.get('restore'):
+            customer = self.get_customer(options['restore'])
+            if customer is None:
+                return
+            item_count, payment_count = restore_customer(customer.id)
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f'Restored {item_count} items and {payment_count} payments of {customer.customers_name}'
+                )
+            )
+            return
+
+        if options.get('customer'):
+            customer = self.get_customer(options['customer'])
+            if customer is None:
+                return
+            if customer.status not in ARCHIVED_STATUSES:
+                self.stdout.write(
+                    self.style.ERROR(f'Customer {customer.id} is {customer.status}; only closed contracts are archived')
+                )
+                return
+            item_count, payment_count = archive_customers([customer.id])
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f'Archived {item_count} items and {payment_count} payments of {customer.customers_name}'
+                )
+            )
+            return
+
+        customer_count, item_count, payment_count = archive_closed_contracts(
+            closed_before=archive_cutoff(options['older_than']),
+            batch_size=options['batch_size'],
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Archived {item_count} items and {payment_count} payments of {customer_count} closed contracts'
+            )
+        )
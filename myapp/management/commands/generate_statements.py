@@ -0,0 +1,65 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from myapp.models import Customer
+from myapp.statements import generate_statements, last_closed_month, latest_statement_month
+
+class Command(BaseCommand):
+    help = (
+        'Generate the MonthlyStatement rows up to the last closed month. Run it at month close '
+        '(e.g. from cron on the 1st); by default it picks up from the newest generated month.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--since',
+            help='First month to (re)generate, as YYYY-MM'
+        )
+        parser.add_argument(
+            '--through',
+            help='Last month to generate, as YYYY-MM (default: last month)'
+        )
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            help='Regenerate every month of the payment history'
+        )
+        parser.add_argument(
+            '--customer',
+            type=int,
+            help='Only generate the statements of this customer ID'
+        )
+
+    def parse_month(self, value, option):
+        try:
+            return datetime.strptime(value, '%Y-%m').date()
+        except ValueError:
+            raise CommandError(f'{option} must be a month like 2025-03, not {value!r}')
+
+    def handle(self, *args, **options):
+        customer_id = options.get('customer')
+        if customer_id and not Customer.objects.filter(id=customer_id).exists():
+            self.stdout.write(
+                self.style.ERROR(f'Customer {customer_id} not found')
+            )
+            return
+
+        through = self.parse_month(options['through'], '--through') if options.get('through') else last_closed_month()
+        if options.get('full'):
+            since = None
+        elif options.get('since'):
+            since = self.parse_month(options['since'], '--since')
+        else:
+            # The newest generated month is redone to pick up payments recorded after its run
+            since = latest_statement_month()
+
+        count = generate_statements(
+            since=since,
+            through=through,
+            customer_ids=[customer_id] if customer_id else None,
+        )
+
+        first = since.strftime('%Y-%m') if since else 'the first payment'
+        self.stdout.write(
+            self.style.SUCCESS(f'Generated {count} monthly statements from {first} through {through:%Y-%m}')
+        )
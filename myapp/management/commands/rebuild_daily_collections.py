@@ -0,0 +1,27 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from myapp.models import DailyCollection
+
+class Command(BaseCommand):
+    help = 'Rebuild (backfill) the DailyCollection rollup from PaymentRecord'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--since',
+            help='Only rebuild the days from this date on (YYYY-MM-DD)'
+        )
+
+    def handle(self, *args, **options):
+        since = None
+        if options.get('since'):
+            try:
+                since = datetime.strptime(options['since'], '%Y-%m-%d').date()
+            except ValueError:
+                raise CommandError(f"--since must be a date like 2025-03-01, not {options['since']!r}")
+
+        count = DailyCollection.rebuild_all(since=since)
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Rebuilt {count} daily collection rows')
+        )
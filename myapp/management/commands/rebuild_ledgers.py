@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+from myapp.models import Customer, CustomerLedger, ItemLedger
+
+class Command(BaseCommand):
+    help = 'Rebuild the CustomerLedger/ItemLedger payment summaries from PaymentRecord'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--customer',
+            type=int,
+            help='Only rebuild the ledgers of this customer ID'
+        )
+
+    def handle(self, *args, **options):
+        customer_id = options.get('customer')
+
+        if customer_id:
+            try:
+                customer = Customer.objects.get(id=customer_id)
+            except Customer.DoesNotExist:
+                self.stdout.write(
+                    self.style.ERROR(f'Customer {customer_id} not found')
+                )
+                return
+
+            CustomerLedger.refresh_for(customer)
+            for item in customer.items.all():
+                ItemLedger.refresh_for(item)
+
+            self.stdout.write(
+                self.style.SUCCESS(f'Rebuilt ledgers for {customer.customers_name}')
+            )
+            return
+
+        customer_count = CustomerLedger.rebuild_all()
+        item_count = ItemLedger.rebuild_all()
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Rebuilt {customer_count} customer ledgers and {item_count} item ledgers')
+        )
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from myapp.models import CustomerSearchEntry
+from myapp.search import install_search_index
+
+class Command(BaseCommand):
+    help = 'Rebuild the customer search entries and their full-text index'
+
+    def handle(self, *args, **options):
+        count = CustomerSearchEntry.rebuild_all()
+        # Recreates anything missing and re-syncs the SQLite FTS table with the entries
+        install_search_index()
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Rebuilt the search index for {count} customers')
+        )
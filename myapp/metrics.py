@@ -0,0 +1,150 @@
+import contextvars
+import functools
+import logging
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.template.base import Template
+
+logger = logging.getLogger('myapp')
+
+PERCENTILES = (50, 90, 95, 99)
+METRIC_FIELDS = ('total_ms', 'sql_count', 'sql_ms', 'template_ms')
+
+# Rolling window of samples per URL name - per process, like the other in-memory caches
+_samples = defaultdict(lambda: deque(maxlen=settings.REQUEST_METRICS_WINDOW))
+_samples_lock = threading.Lock()
+_current = contextvars.ContextVar('request_metrics_sample', default=None)
+
+
+def query_budget(queries):
+    """Declare the most queries a view may run per request - checked by the tests, logged in production"""
+    def decorator(view):
+        view.query_budget = queries
+        return view
+    return decorator
+
+
+class RequestSample:
+    """What one request spent: SQL statements and time, template rendering time"""
+
+    def __init__(self):
+        self.sql_count = 0
+        self.sql_seconds = 0.0
+        self.template_seconds = 0.0
+        self.rendering = False
+
+    def __call__(self, execute, sql, params, many, context):
+        # connection.execute_wrapper() hook
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_count += 1
+            self.sql_seconds += time.perf_counter() - start
+
+
+def _timed_render(render):
+    @functools.wraps(render)
+    def wrapper(self, context):
+        sample = _current.get()
+        # {% include %}/{% extends %} render nested templates - only the outermost one is timed
+        if sample is None or sample.rendering:
+            return render(self, context)
+        sample.rendering = True
+        start = time.perf_counter()
+        try:
+            return render(self, context)
+        finally:
+            sample.template_seconds += time.perf_counter() - start
+            sample.rendering = False
+    wrapper.timed = True
+    return wrapper
+
+
+def install_template_timer():
+    if not getattr(Template.render, 'timed', False):
+        Template.render = _timed_render(Template.render)
+
+
+def record(view_name, values):
+    with _samples_lock:
+        _samples[view_name].append(values)
+
+
+def reset_metrics():
+    with _samples_lock:
+        _samples.clear()
+
+
+def percentile(values, rank):
+    """Nearest-rank percentile of a sorted list"""
+    index = max(0, -(-len(values) * rank // 100) - 1)
+    return values[index]
+
+
+def metrics_snapshot():
+    """{url name: {'count': n, 'total_ms': {'p50': ..., ...}, ...}} over each view's rolling window"""
+    with _samples_lock:
+        samples = {view_name: list(values) for view_name, values in _samples.items()}
+    snapshot = {}
+    for view_name, values in sorted(samples.items()):
+        stats = {'count': len(values)}
+        for field in METRIC_FIELDS:
+            ordered = sorted(value[field] for value in values)
+            stats[field] = {f'p{rank}': round(percentile(ordered, rank), 2) for rank in PERCENTILES}
+        snapshot[view_name] = stats
+    return snapshot
+
+
+class RequestMetricsMiddleware:
+    """Per-request SQL count/time, template time and total time, keyed by URL name.
+
+    Enabled by REQUEST_METRICS_ENABLED. Requests slower than REQUEST_METRICS_SLOW_MS, or over
+    their view's query_budget, are logged to the myapp logger; request_metrics serves percentiles.
+    """
+
+    def __init__(self, get_response):
+        if not settings.REQUEST_METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        install_template_timer()
+        self.get_response = get_response
+
+    def __call__(self, request):
+        sample = RequestSample()
+        token = _current.set(sample)
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(sample))
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        total_ms = (time.perf_counter() - start) * 1000
+
+        match = getattr(request, 'resolver_match', None)
+        view_name = match.view_name if match and match.view_name else '<unresolved>'
+        values = {
+            'total_ms': total_ms,
+            'sql_count': sample.sql_count,
+            'sql_ms': sample.sql_seconds * 1000,
+            'template_ms': sample.template_seconds * 1000,
+        }
+        record(view_name, values)
+
+        budget = getattr(match.func, 'query_budget', None) if match else None
+        over_budget = budget is not None and sample.sql_count > budget
+        if total_ms >= settings.REQUEST_METRICS_SLOW_MS or over_budget:
+            logger.warning(
+                f'Slow request {view_name} {request.method} {request.path}: {total_ms:.0f}ms, '
+                f'{sample.sql_count} queries ({values["sql_ms"]:.0f}ms'
+                f'{f", over budget of {budget}" if over_budget else ""}), '
+                f'templates {values["template_ms"]:.0f}ms'
+            )
+        return response
@@ -0,0 +1,114 @@
+# Generated by Django 5.2.7 on 2026-10-16 22:19
+
+from decimal import Decimal
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Max, Sum
+
+
+def _ledger_values(totals, contract_amount, monthly_due, term):
+    total_paid = totals.get('total_paid') or Decimal('0.00')
+    total_rebates = totals.get('total_rebates') or Decimal('0.00')
+    contract_amount = contract_amount or Decimal('0.00')
+    deductions = total_paid + total_rebates
+    return {
+        'total_paid': total_paid,
+        'total_rebates': total_rebates,
+        'payment_count': totals.get('payment_count') or 0,
+        'last_payment_date': totals.get('last_payment_date'),
+        'contract_amount': contract_amount,
+        'months_covered': min(int(deductions // monthly_due), term) if monthly_due and term else 0,
+        'remaining_balance': max(Decimal('0.00'), contract_amount - deductions),
+    }
+
+
+def seed_ledgers(apps, schema_editor):
+    """Build the ledgers for existing data with one grouped aggregate per table"""
+    Customer = apps.get_model('myapp', 'Customer')
+    CustomerItem = apps.get_model('myapp', 'CustomerItem')
+    PaymentRecord = apps.get_model('myapp', 'PaymentRecord')
+    CustomerLedger = apps.get_model('myapp', 'CustomerLedger')
+    ItemLedger = apps.get_model('myapp', 'ItemLedger')
+
+    aggregates = {
+        'total_paid': Sum('amount_paid'),
+        'total_rebates': Sum('rebate_amount'),
+        'payment_count': Count('id'),
+        'last_payment_date': Max('payment_date'),
+    }
+
+    customer_totals = {
+        row.pop('customer'): row
+        for row in PaymentRecord.objects.order_by().values('customer').annotate(**aggregates)
+    }
+    CustomerLedger.objects.bulk_create([
+        CustomerLedger(
+            customer_id=customer.id,
+            **_ledger_values(
+                customer_totals.get(customer.id, {}),
+                (customer.monthly_due or Decimal('0.00')) * (customer.term or 0),
+                customer.monthly_due,
+                customer.term,
+            )
+        )
+        for customer in Customer.objects.all().iterator()
+    ], batch_size=500)
+
+    item_totals = {
+        row.pop('customer_item'): row
+        for row in PaymentRecord.objects.filter(customer_item__isnull=False)
+        .order_by().values('customer_item').annotate(**aggregates)
+    }
+    ItemLedger.objects.bulk_create([
+        ItemLedger(
+            item_id=item.id,
+            **_ledger_values(item_totals.get(item.id, {}), item.total_contract_amount, item.monthly_due, item.term_months)
+        )
+        for item in CustomerItem.objects.all().iterator()
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0010_fix_customerhistory_missing_columns'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CustomerLedger',
+            fields=[
+                ('total_paid', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('total_rebates', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('payment_count', models.IntegerField(default=0)),
+                ('last_payment_date', models.DateField(blank=True, null=True)),
+                ('contract_amount', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('months_covered', models.IntegerField(default=0)),
+                ('remaining_balance', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('customer', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='ledger', serialize=False, to='myapp.customer')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='ItemLedger',
+            fields=[
+                ('total_paid', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('total_rebates', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('payment_count', models.IntegerField(default=0)),
+                ('last_payment_date', models.DateField(blank=True, null=True)),
+                ('contract_amount', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('months_covered', models.IntegerField(default=0)),
+                ('remaining_balance', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('item', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='ledger', serialize=False, to='myapp.customeritem')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.RunPython(seed_ledgers, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.7 on 2026-10-16 22:21
+
+from dateutil.relativedelta import relativedelta
+from django.db import migrations, models
+
+
+def populate_next_due_date(apps, schema_editor):
+    CustomerLedger = apps.get_model('myapp', 'CustomerLedger')
+
+    ledgers = []
+    for ledger in CustomerLedger.objects.select_related('customer').iterator():
+        if ledger.customer.date_delivered:
+            ledger.next_due_date = ledger.customer.date_delivered + relativedelta(months=ledger.payment_count + 1)
+            ledgers.append(ledger)
+    CustomerLedger.objects.bulk_update(ledgers, ['next_due_date'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0011_customerledger_itemledger'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customerledger',
+            name='next_due_date',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.RunPython(populate_next_due_date, migrations.RunPython.noop),
+    ]
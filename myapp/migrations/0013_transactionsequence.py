@@ -0,0 +1,47 @@
+# Generated by Django 5.2.7 on 2026-10-16 22:25
+
+import re
+
+from django.db import migrations, models
+
+TXN_PATTERN = re.compile(r'^TXN-(\d{4}-\d{2})-(\d{4,5})$')
+
+
+def seed_sequences(apps, schema_editor):
+    """Start each month's sequence after the highest TXN-YYYY-MM-NNNN already issued"""
+    PaymentRecord = apps.get_model('myapp', 'PaymentRecord')
+    TransactionSequence = apps.get_model('myapp', 'TransactionSequence')
+
+    last_numbers = {}
+    numbers = PaymentRecord.objects.filter(transaction_number__startswith='TXN-').values_list(
+        'transaction_number', flat=True
+    )
+    for transaction_number in numbers.iterator():
+        match = TXN_PATTERN.match(transaction_number)
+        if match:
+            year_month, number = match.group(1), int(match.group(2))
+            last_numbers[year_month] = max(number, last_numbers.get(year_month, 0))
+
+    TransactionSequence.objects.bulk_create(
+        [TransactionSequence(year_month=year_month, last_number=number) for year_month, number in last_numbers.items()],
+        batch_size=500
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0012_customerledger_next_due_date'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TransactionSequence',
+            fields=[
+                ('year_month', models.CharField(max_length=7, primary_key=True, serialize=False)),
+                ('last_number', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(seed_sequences, migrations.RunPython.noop),
+    ]
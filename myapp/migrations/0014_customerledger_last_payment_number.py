@@ -0,0 +1,35 @@
+# Generated by Django 5.2.7 on 2026-10-16 22:28
+
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def populate_last_payment_number(apps, schema_editor):
+    CustomerLedger = apps.get_model('myapp', 'CustomerLedger')
+    PaymentRecord = apps.get_model('myapp', 'PaymentRecord')
+
+    last_numbers = dict(
+        PaymentRecord.objects.order_by().values('customer').annotate(last=Max('payment_number'))
+        .values_list('customer', 'last')
+    )
+    ledgers = []
+    for ledger in CustomerLedger.objects.filter(customer_id__in=list(last_numbers)).iterator():
+        ledger.last_payment_number = last_numbers[ledger.customer_id] or 0
+        ledgers.append(ledger)
+    CustomerLedger.objects.bulk_update(ledgers, ['last_payment_number'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0013_transactionsequence'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customerledger',
+            name='last_payment_number',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(populate_last_payment_number, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.7 on 2026-10-16 22:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0014_customerledger_last_payment_number'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='customer',
+            index=models.Index(fields=['status', '-created_at'], name='customer_status_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customer',
+            index=models.Index(condition=models.Q(('status', 'active')), fields=['-created_at'], name='customer_active_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customerhistory',
+            index=models.Index(fields=['final_status', '-completion_date'], name='history_status_completed_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customerhistory',
+            index=models.Index(fields=['original_customer_id'], name='history_original_customer_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customeritem',
+            index=models.Index(fields=['customer', 'status'], name='item_customer_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='paymentrecord',
+            index=models.Index(fields=['customer', 'payment_date'], name='payment_customer_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='paymentrecord',
+            index=models.Index(fields=['customer', 'customer_item', 'payment_date', 'id'], name='payment_cust_item_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='paymentrecord',
+            index=models.Index(fields=['payment_date'], name='payment_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='paymentrecord',
+            index=models.Index(fields=['-created_at'], name='payment_created_idx'),
+        ),
+    ]
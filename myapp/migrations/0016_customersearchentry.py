@@ -0,0 +1,110 @@
+# Generated by Django 5.2.7 on 2026-10-16 22:38
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Frozen copy of myapp.search's vendor SQL as of this migration - migrations must not import app code
+INSTALL_SQL = {
+    'sqlite': [
+        """CREATE VIRTUAL TABLE IF NOT EXISTS myapp_customersearch_fts USING fts5(
+            name, details, content='myapp_customersearchentry', content_rowid='customer_id', tokenize='unicode61'
+        )""",
+        """CREATE TRIGGER IF NOT EXISTS myapp_customersearch_fts_ai AFTER INSERT ON myapp_customersearchentry BEGIN
+            INSERT INTO myapp_customersearch_fts(rowid, name, details) VALUES (new.customer_id, new.name, new.details);
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS myapp_customersearch_fts_ad AFTER DELETE ON myapp_customersearchentry BEGIN
+            INSERT INTO myapp_customersearch_fts(myapp_customersearch_fts, rowid, name, details)
+            VALUES ('delete', old.customer_id, old.name, old.details);
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS myapp_customersearch_fts_au AFTER UPDATE ON myapp_customersearchentry BEGIN
+            INSERT INTO myapp_customersearch_fts(myapp_customersearch_fts, rowid, name, details)
+            VALUES ('delete', old.customer_id, old.name, old.details);
+            INSERT INTO myapp_customersearch_fts(rowid, name, details) VALUES (new.customer_id, new.name, new.details);
+        END""",
+        "INSERT INTO myapp_customersearch_fts(myapp_customersearch_fts) VALUES ('rebuild')",
+    ],
+    'postgresql': [
+        # pg_trgm needs CREATE on the database (PostgreSQL 13+) or a superuser - skipped, with its index, otherwise
+        """DO $$ BEGIN
+            CREATE EXTENSION IF NOT EXISTS pg_trgm;
+        EXCEPTION WHEN insufficient_privilege OR undefined_file THEN
+            RAISE NOTICE 'pg_trgm unavailable - customer search substring matches run unindexed';
+        END $$""",
+        "CREATE INDEX IF NOT EXISTS customer_search_vector_idx ON myapp_customersearchentry "
+        "USING gin (to_tsvector('simple', (name || ' ' || details)))",
+        """DO $$ BEGIN
+            IF EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm') THEN
+                CREATE INDEX IF NOT EXISTS customer_search_trgm_idx ON myapp_customersearchentry
+                USING gin ((name || ' ' || details) gin_trgm_ops);
+            END IF;
+        END $$""",
+    ],
+}
+UNINSTALL_SQL = {
+    'sqlite': [
+        'DROP TRIGGER IF EXISTS myapp_customersearch_fts_ai',
+        'DROP TRIGGER IF EXISTS myapp_customersearch_fts_ad',
+        'DROP TRIGGER IF EXISTS myapp_customersearch_fts_au',
+        'DROP TABLE IF EXISTS myapp_customersearch_fts',
+    ],
+    'postgresql': [
+        'DROP INDEX IF EXISTS customer_search_vector_idx',
+        'DROP INDEX IF EXISTS customer_search_trgm_idx',
+    ],
+}
+
+
+def populate_entries(apps, schema_editor):
+    """Same document as CustomerSearchEntry.document_for(): name, then address, contact and items"""
+    Customer = apps.get_model('myapp', 'Customer')
+    CustomerItem = apps.get_model('myapp', 'CustomerItem')
+    CustomerSearchEntry = apps.get_model('myapp', 'CustomerSearchEntry')
+
+    items_by_customer = {}
+    for item in CustomerItem.objects.order_by('customer_id', 'id').iterator():
+        items_by_customer.setdefault(item.customer_id, []).extend([item.item_name, item.item_model])
+
+    entries = []
+    for customer in Customer.objects.all().iterator():
+        parts = [customer.address, customer.contact, customer.item] + items_by_customer.get(customer.id, [])
+        entries.append(CustomerSearchEntry(
+            customer_id=customer.id,
+            name=customer.customers_name,
+            details=' '.join(part for part in parts if part),
+        ))
+    CustomerSearchEntry.objects.bulk_create(entries, batch_size=500)
+
+
+def run_vendor_sql(schema_editor, statements):
+    for statement in statements.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(statement, params=None)
+
+
+def install_index(apps, schema_editor):
+    run_vendor_sql(schema_editor, INSTALL_SQL)
+
+
+def uninstall_index(apps, schema_editor):
+    run_vendor_sql(schema_editor, UNINSTALL_SQL)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0015_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CustomerSearchEntry',
+            fields=[
+                ('customer', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_entry', serialize=False, to='myapp.customer')),
+                ('name', models.CharField(max_length=255)),
+                ('details', models.TextField(blank=True, default='')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(populate_entries, migrations.RunPython.noop),
+        # FTS5 table + triggers on SQLite, tsvector/trigram GIN indexes on PostgreSQL
+        migrations.RunPython(install_index, uninstall_index),
+    ]
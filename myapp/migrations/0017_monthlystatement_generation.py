@@ -0,0 +1,47 @@
+# Generated by Django 5.2.7 on 2026-10-16 22:49
+
+from django.db import migrations, models
+
+
+def drop_duplicate_statements(apps, schema_editor):
+    """Keep the newest statement of each customer and date so the unique constraint applies"""
+    MonthlyStatement = apps.get_model('myapp', 'MonthlyStatement')
+    seen = set()
+    duplicates = []
+    for pk, customer_id, statement_date in MonthlyStatement.objects.order_by('-id').values_list(
+        'id', 'customer_id', 'statement_date'
+    ):
+        if (customer_id, statement_date) in seen:
+            duplicates.append(pk)
+        seen.add((customer_id, statement_date))
+    MonthlyStatement.objects.filter(pk__in=duplicates).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0016_customersearchentry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='monthlystatement',
+            name='transaction_number',
+            field=models.CharField(blank=True, default='', max_length=50),
+        ),
+        migrations.AddField(
+            model_name='monthlystatement',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AlterField(
+            model_name='monthlystatement',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('paid', 'Paid'), ('overdue', 'Overdue'), ('partial', 'Partial Payment'), ('unpaid', 'Unpaid')], default='pending', max_length=20),
+        ),
+        migrations.RunPython(drop_duplicate_statements, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='monthlystatement',
+            constraint=models.UniqueConstraint(fields=('customer', 'statement_date'), name='statement_customer_month_uniq'),
+        ),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 5.2.7 on 2026-10-16 22:56
+
+import django.db.models.deletion
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def seed_collections(apps, schema_editor):
+    """Backfill the rollup from existing payments with one grouped aggregate"""
+    PaymentRecord = apps.get_model('myapp', 'PaymentRecord')
+    DailyCollection = apps.get_model('myapp', 'DailyCollection')
+    rows = PaymentRecord.objects.order_by().values('payment_date', 'payment_method', 'recorded_by').annotate(
+        count=Count('id'), amount=Sum('amount_paid'), rebates=Sum('rebate_amount')
+    )
+    DailyCollection.objects.bulk_create(
+        [
+            DailyCollection(
+                collection_date=row['payment_date'],
+                payment_method=row['payment_method'] or '',
+                recorded_by_id=row['recorded_by'],
+                payment_count=row['count'],
+                total_amount=row['amount'] or Decimal('0.00'),
+                total_rebates=row['rebates'] or Decimal('0.00'),
+            )
+            for row in rows
+        ],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0017_monthlystatement_generation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyCollection',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('collection_date', models.DateField()),
+                ('payment_method', models.CharField(max_length=50)),
+                ('payment_count', models.IntegerField(default=0)),
+                ('total_amount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('total_rebates', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('recorded_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(condition=models.Q(('recorded_by__isnull', False)), fields=('collection_date', 'payment_method', 'recorded_by'), name='daily_collection_recorder_uniq'), models.UniqueConstraint(condition=models.Q(('recorded_by__isnull', True)), fields=('collection_date', 'payment_method'), name='daily_collection_unrecorded_uniq')],
+            },
+        ),
+        migrations.RunPython(seed_collections, migrations.RunPython.noop),
+    ]
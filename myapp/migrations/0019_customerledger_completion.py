@@ -0,0 +1,37 @@
+# Generated by Django 5.2.7 on 2026-10-16 22:59
+
+from decimal import Decimal
+
+from django.db import migrations, models
+
+
+def populate_completion(apps, schema_editor):
+    """Payments made per 100 months of term, as CustomerLedger.apply_terms() now stores it"""
+    CustomerLedger = apps.get_model('myapp', 'CustomerLedger')
+    ledgers = []
+    for ledger in CustomerLedger.objects.select_related('customer').iterator():
+        term = ledger.customer.term
+        if term and term > 0:
+            ledger.completion_percentage = (Decimal(ledger.payment_count * 100) / term).quantize(Decimal('0.01'))
+            ledgers.append(ledger)
+    CustomerLedger.objects.bulk_update(ledgers, ['completion_percentage'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0018_dailycollection'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customerledger',
+            name='completion_percentage',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=7),
+        ),
+        migrations.AddIndex(
+            model_name='customerledger',
+            index=models.Index(fields=['-completion_percentage', 'customer'], name='ledger_completion_idx'),
+        ),
+        migrations.RunPython(populate_completion, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 5.2.7 on 2026-10-16 23:02
+
+from django.db import migrations, models
+
+# The name and transaction filters are case-insensitive prefix matches. Django spells them
+# UPPER(col::text) LIKE / col::text LIKE on PostgreSQL, which a plain B-tree only serves
+# under the C collation - these pattern_ops indexes serve them under any collation.
+# SQLite's LIKE is case-insensitive already; NOCASE indexes let it use them for prefixes.
+INSTALL_SQL = {
+    'sqlite': [
+        'CREATE INDEX IF NOT EXISTS history_name_prefix_idx ON myapp_customerhistory '
+        '(final_status, customers_name COLLATE NOCASE)',
+        'CREATE INDEX IF NOT EXISTS history_txn_prefix_idx ON myapp_customerhistory '
+        '(final_status, transaction_number COLLATE NOCASE)',
+    ],
+    'postgresql': [
+        'CREATE INDEX IF NOT EXISTS history_name_prefix_idx ON myapp_customerhistory '
+        '(final_status, UPPER(customers_name::text) text_pattern_ops)',
+        'CREATE INDEX IF NOT EXISTS history_txn_prefix_idx ON myapp_customerhistory '
+        '(final_status, UPPER(transaction_number::text) text_pattern_ops)',
+    ],
+}
+UNINSTALL_SQL = {
+    vendor: [
+        'DROP INDEX IF EXISTS history_name_prefix_idx',
+        'DROP INDEX IF EXISTS history_txn_prefix_idx',
+    ]
+    for vendor in ('sqlite', 'postgresql')
+}
+
+
+def run_vendor_sql(schema_editor, statements):
+    for statement in statements.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(statement, params=None)
+
+
+def install_indexes(apps, schema_editor):
+    run_vendor_sql(schema_editor, INSTALL_SQL)
+
+
+def uninstall_indexes(apps, schema_editor):
+    run_vendor_sql(schema_editor, UNINSTALL_SQL)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0019_customerledger_completion'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='customerhistory',
+            name='history_status_completed_idx',
+        ),
+        migrations.AddIndex(
+            model_name='customerhistory',
+            index=models.Index(fields=['final_status', '-completion_date', '-id'], name='history_status_completed_idx'),
+        ),
+        # Prefix-search indexes for the name and transaction # filters
+        migrations.RunPython(install_indexes, uninstall_indexes),
+    ]
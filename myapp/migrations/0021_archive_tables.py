@@ -0,0 +1,64 @@
+# Generated by Django 5.2.7 on 2026-10-16 23:06
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0020_customerhistory_paging'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedCustomerItem',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('item_name', models.CharField(max_length=100)),
+                ('item_model', models.CharField(max_length=100)),
+                ('item_description', models.TextField(blank=True, default='')),
+                ('item_price', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('quantity', models.IntegerField(default=1)),
+                ('original_price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('downpayment', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('good_as_cash', models.CharField(default='no', max_length=3)),
+                ('rebate_amount', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('monthly_due', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('term_months', models.IntegerField(default=0)),
+                ('total_contract_amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('purchase_date', models.DateField()),
+                ('contract_start_date', models.DateField()),
+                ('contract_end_date', models.DateField()),
+                ('first_due_date', models.DateField()),
+                ('status', models.CharField(default='active', max_length=20)),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('customer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_items', to='myapp.customer')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ArchivedPaymentRecord',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('payment_number', models.IntegerField(blank=True, null=True)),
+                ('payment_date', models.DateField()),
+                ('amount_paid', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('payment_method', models.CharField(default='Cash', max_length=50)),
+                ('transaction_number', models.CharField(blank=True, max_length=50, null=True, unique=True)),
+                ('has_rebate', models.BooleanField(default=False)),
+                ('rebate_amount', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('reference_id', models.IntegerField(blank=True, null=True)),
+                ('notes', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('customer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_payments', to='myapp.customer')),
+                ('customer_item', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='payments', to='myapp.archivedcustomeritem')),
+                ('recorded_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['customer', 'payment_date'], name='archived_payment_cust_date_idx'), models.Index(fields=['payment_date'], name='archived_payment_date_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.7 on 2026-10-16 23:40
+
+from django.db import migrations, models
+
+
+def populate_customer_active(apps, schema_editor):
+    """Copy each customer's status onto their ledger, as CustomerLedger.apply_terms() now does"""
+    CustomerLedger = apps.get_model('myapp', 'CustomerLedger')
+    Customer = apps.get_model('myapp', 'Customer')
+    CustomerLedger.objects.exclude(
+        customer__in=Customer.objects.filter(status='active').values('pk')
+    ).update(customer_active=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0021_archive_tables'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customerledger',
+            name='customer_active',
+            field=models.BooleanField(default=True),
+        ),
+        migrations.RunPython(populate_customer_active, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='customerledger',
+            name='ledger_completion_idx',
+        ),
+        migrations.AddIndex(
+            model_name='customerledger',
+            index=models.Index(
+                condition=models.Q(('customer_active', True)),
+                fields=['-completion_percentage', 'customer'],
+                name='ledger_active_completion_idx',
+            ),
+        ),
+    ]
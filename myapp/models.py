@@ -1,4 +1,8 @@
-from django.db import models
+from collections import defaultdict
+
+from django.core.cache import cache
+from django.db import models, transaction
+from django.db.models import Sum, Count, Max
 from django.contrib.auth.models import AbstractUser
 from django.utils import timezone
 from decimal import Decimal
@@ -56,9 +60,55 @@ class Customer(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    class Meta:
+        indexes = [
+            # Customer lists: status filter, newest first
+            models.Index(fields=['status', '-created_at'], name='customer_status_created_idx'),
+            # Dashboards only ever look at active customers
+            models.Index(fields=['-created_at'], condition=models.Q(status='active'), name='customer_active_created_idx'),
+        ]
+    
     def __str__(self):
         return self.customers_name
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # The status as loaded - the post_save signal restores archived rows only on reactivation
+        instance._loaded_status = instance.__dict__.get('status')
+        return instance
+    
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        # Keep the ledger's contract-derived figures in step with the contract terms
+        CustomerLedger.sync_terms(self)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or CustomerSearchEntry.CUSTOMER_FIELDS & set(update_fields):
+            CustomerSearchEntry.refresh_for(self)
+    
+    @property
+    def ledger_summary(self):
+        """Customer ledger row, or an empty unsaved one if it has not been built yet"""
+        try:
+            return self.ledger
+        except CustomerLedger.DoesNotExist:
+            return CustomerLedger(customer=self)
+    
+    def payment_sources(self):
+        """Querysets of the customer's payments: the live ones, plus the archived ones for a closed
+        contract - only closed contracts are archived, and reactivating one restores its rows"""
+        sources = [PaymentRecord.objects.filter(customer=self)]
+        if self.status != 'active':
+            sources.append(ArchivedPaymentRecord.objects.filter(customer=self))
+        return sources
+    
+    def item_sources(self):
+        """payment_sources() for the customer's items"""
+        sources = [CustomerItem.objects.filter(customer=self)]
+        if self.status != 'active':
+            sources.append(ArchivedCustomerItem.objects.filter(customer=self))
+        return sources
+    
     @property
     def balance(self):
         """Calculate remaining balance"""
@@ -66,8 +116,8 @@ class Customer(models.Model):
     
     @property
     def payment_count(self):
-        """Count of payments made"""
-        return self.payment_records.count()
+        """Count of payments made (read from the ledger summary)"""
+        return self.ledger_summary.payment_count
     
     @property
     def next_due_date(self):
@@ -171,15 +221,36 @@ class PaymentRecord(models.Model):
     
     class Meta:
         ordering = ['-payment_date', '-created_at']
+        indexes = [
+            # Per-customer history (also serves plain customer filters)
+            models.Index(fields=['customer', 'payment_date'], name='payment_customer_date_idx'),
+            # Per-item history in chronological order with a stable tie-breaker
+            models.Index(fields=['customer', 'customer_item', 'payment_date', 'id'], name='payment_cust_item_date_idx'),
+            # Collections/report date ranges
+            models.Index(fields=['payment_date'], name='payment_date_idx'),
+            # Recent activity feeds
+            models.Index(fields=['-created_at'], name='payment_created_idx'),
+        ]
     
     def __str__(self):
         return f"Payment #{self.payment_number} - {self.customer.customers_name}"
     
     def save(self, *args, **kwargs):
+        with transaction.atomic():
+            if self._state.adding:
+                self._save_new(*args, **kwargs)
+            else:
+                self._save_existing(*args, **kwargs)
+    
+    def _save_new(self, *args, **kwargs):
+        """Insert path - a constant number of queries, however many payments the customer has"""
+        # Locking the ledger rows serializes concurrent payments of the same customer/item
+        ledger = CustomerLedger.locked_for(self.customer)
+        item_ledger = ItemLedger.locked_for(self.customer_item) if self.customer_item_id else None
+        
         # Auto-generate payment number if not set
         if not self.payment_number:
-            last_payment = PaymentRecord.objects.filter(customer=self.customer).order_by('-payment_number').first()
-            self.payment_number = (last_payment.payment_number + 1) if last_payment else 1
+            self.payment_number = ledger.last_payment_number + 1
         
         # Auto-generate transaction number if not set or empty
         if not self.transaction_number or self.transaction_number.strip() == '':
@@ -187,32 +258,99 @@ class PaymentRecord(models.Model):
         
         super().save(*args, **kwargs)
         
+        # Views may hand over raw POST values
+        amount_paid = PaymentRecord._meta.get_field('amount_paid').to_python(self.amount_paid)
+        Customer.objects.filter(pk=self.customer_id).update(payments=models.F('payments') + amount_paid)
+        
+        ledger.add_payment(self)
+        ledger.apply_terms(self.customer)
+        ledger.save(update_fields=CustomerLedger.PAYMENT_FIELDS)
+        # The ledger total is the sum the old re-aggregate produced
+        self.customer.payments = ledger.total_paid
+        
+        if item_ledger is not None:
+            item_ledger.add_payment(self)
+            item_ledger.apply_terms(self.customer_item)
+            item_ledger.save(update_fields=ItemLedger.PAYMENT_FIELDS)
+        
+        DailyCollection.add_payments([self])
+    
+    def _save_existing(self, *args, **kwargs):
+        """Edit path - rare, so the touched totals are simply recalculated"""
+        # Remember the previous owner so a re-assigned payment also refreshes the old ledgers
+        previous = PaymentRecord.objects.filter(pk=self.pk).values('customer_id', 'customer_item_id', 'payment_date').first()
+        
+        if not self.payment_number:
+            last_number = PaymentRecord.objects.filter(customer_id=self.customer_id).aggregate(
+                last=Max('payment_number')
+            )['last']
+            self.payment_number = (last_number or 0) + 1
+        
+        if not self.transaction_number or self.transaction_number.strip() == '':
+            self.transaction_number = self.generate_transaction_number()
+        
+        super().save(*args, **kwargs)
+        
         # Update customer's total payments
         self.customer.payments = self.customer.payment_records.aggregate(
             total=models.Sum('amount_paid')
         )['total'] or Decimal('0.00')
-        self.customer.save()
+        Customer.objects.filter(pk=self.customer_id).update(payments=self.customer.payments)
+        
+        self._refresh_ledgers(previous)
+        DailyCollection.refresh_dates({
+            PaymentRecord._meta.get_field('payment_date').to_python(self.payment_date),
+            previous['payment_date'] if previous else None,
+        })
+    
+    def delete(self, *args, **kwargs):
+        previous = {'customer_id': self.customer_id, 'customer_item_id': self.customer_item_id}
+        with transaction.atomic():
+            result = super().delete(*args, **kwargs)
+            self._refresh_ledgers(previous, include_self=False)
+        return result
+    
+    def _refresh_ledgers(self, previous=None, include_self=True):
+        """Recalculate the customer/item ledgers touched by this payment"""
+        customer_ids = set()
+        item_ids = set()
+        if include_self:
+            customer_ids.add(self.customer_id)
+            item_ids.add(self.customer_item_id)
+        if previous:
+            customer_ids.add(previous['customer_id'])
+            item_ids.add(previous['customer_item_id'])
+        
+        for customer in Customer.objects.filter(id__in=customer_ids):
+            CustomerLedger.refresh_for(customer)
+        for item in CustomerItem.objects.filter(id__in=[i for i in item_ids if i]):
+            ItemLedger.refresh_for(item)
     
     def generate_transaction_number(self):
         """Generate transaction number in format TXN-YYYY-MM-DDDD"""
-        from datetime import datetime
-        
-        year_month = self.payment_date.strftime('%Y-%m') if self.payment_date else datetime.now().strftime('%Y-%m')
+        return PaymentRecord.next_transaction_number(self.payment_date, exclude_id=self.id)
+
+    @staticmethod
+    def next_transaction_number(payment_date=None, exclude_id=None):
+        year_month = (payment_date or date.today()).strftime('%Y-%m')
         
-        # Find the next available number to avoid conflicts
-        counter = 1
+        # Numbers come from the per-month sequence; skip any that were typed in by hand
         while True:
-            txn_number = f"TXN-{year_month}-{counter:04d}"
-            # Exclude current record from check to avoid self-conflict
-            if not PaymentRecord.objects.filter(transaction_number=txn_number).exclude(id=self.id).exists():
+            txn_number = TransactionSequence.allocate(year_month)
+            if not PaymentRecord.taken_transaction_numbers([txn_number], exclude_id=exclude_id):
                 return txn_number
-            counter += 1
-            
-            # Safety check to prevent infinite loop
-            if counter > 9999:
-                # Fallback to timestamp-based number
-                timestamp = datetime.now().strftime('%H%M%S')
-                return f"TXN-{year_month}-{timestamp}"
+
+    @staticmethod
+    def taken_transaction_numbers(numbers, exclude_id=None):
+        """The `numbers` already held by a payment - live or archived, since restore_customer()
+        moves archived payments back with their numbers"""
+        taken = set()
+        for model in (PaymentRecord, ArchivedPaymentRecord):
+            taken.update(
+                model.objects.filter(transaction_number__in=numbers).exclude(id=exclude_id)
+                .values_list('transaction_number', flat=True)
+            )
+        return taken
 
 
 class Transaction(models.Model):
@@ -240,11 +378,19 @@ class MonthlyStatement(models.Model):
         ('paid', 'Paid'),
         ('overdue', 'Overdue'),
         ('partial', 'Partial Payment'),
+        ('unpaid', 'Unpaid'),
     ], default='pending')
+    # Latest payment transaction number of the month (generate_statements)
+    transaction_number = models.CharField(max_length=50, blank=True, default='')
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         ordering = ['-statement_date']
+        # statement_date is the first day of the month - one statement per customer and month
+        constraints = [
+            models.UniqueConstraint(fields=['customer', 'statement_date'], name='statement_customer_month_uniq'),
+        ]
     
     def __str__(self):
         return f"Statement {self.statement_date} - {self.customer.customers_name}"
@@ -273,6 +419,12 @@ class CustomerHistory(models.Model):
     completed_by = models.ForeignKey(CustomUser, on_delete=models.SET_NULL, null=True, blank=True)  # Completed By
     term = models.IntegerField(default=0)  # Term from customer list
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['final_status', '-completion_date', '-id'], name='history_status_completed_idx'),
+            models.Index(fields=['original_customer_id'], name='history_original_customer_idx'),
+        ]
+
     def __str__(self):
         return f"{self.customers_name} - {self.final_status}"
 
@@ -318,9 +470,32 @@ class CustomerItem(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['customer', 'status'], name='item_customer_status_idx'),
+        ]
     
     def __str__(self):
         return f"{self.customer.customers_name} - {self.item_name} {self.item_model}"
+    
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        # Keep the ledger's contract-derived figures in step with the item terms
+        ItemLedger.sync_terms(self)
+        CustomerSearchEntry.refresh_for(self.customer)
+    
+    def delete(self, *args, **kwargs):
+        customer = self.customer
+        result = super().delete(*args, **kwargs)
+        CustomerSearchEntry.refresh_for(customer)
+        return result
+    
+    @property
+    def ledger_summary(self):
+        """Item ledger row, or an empty unsaved one if it has not been built yet"""
+        try:
+            return self.ledger
+        except ItemLedger.DoesNotExist:
+            return ItemLedger(item=self)
 
 class UserActivityLog(models.Model):
     """Audit trail"""
@@ -338,3 +513,578 @@ class UserActivityLog(models.Model):
     
     def __str__(self):
         return f"{self.user.username} - {self.action} at {self.timestamp}"
+
+
+def payment_totals():
+    """Aggregates shared by the ledger refresh and rebuild paths"""
+    return {
+        'total_paid': Sum('amount_paid'),
+        'total_rebates': Sum('rebate_amount'),
+        'payment_count': Count('id'),
+        'last_payment_date': Max('payment_date'),
+        'last_payment_number': Max('payment_number'),
+    }
+
+
+def combine_payment_totals(first, second):
+    """payment_totals() of two sets of payments (live and archived) as one"""
+    combined = {}
+    for name in ('total_paid', 'total_rebates', 'payment_count'):
+        combined[name] = (first.get(name) or 0) + (second.get(name) or 0)
+    for name in ('last_payment_date', 'last_payment_number'):
+        values = [totals[name] for totals in (first, second) if totals.get(name) is not None]
+        combined[name] = max(values) if values else None
+    return combined
+
+
+class LedgerBase(models.Model):
+    """Denormalized payment summary shared by CustomerLedger and ItemLedger"""
+    total_paid = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    total_rebates = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    payment_count = models.IntegerField(default=0)
+    last_payment_date = models.DateField(null=True, blank=True)
+    contract_amount = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    months_covered = models.IntegerField(default=0)
+    remaining_balance = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        abstract = True
+    
+    @property
+    def total_paid_with_rebates(self):
+        return self.total_paid + self.total_rebates
+    
+    def apply_totals(self, totals):
+        """Copy aggregate results from payment_totals() onto the ledger"""
+        self.total_paid = totals.get('total_paid') or Decimal('0.00')
+        self.total_rebates = totals.get('total_rebates') or Decimal('0.00')
+        self.payment_count = totals.get('payment_count') or 0
+        self.last_payment_date = totals.get('last_payment_date')
+    
+    def apply_contract(self, contract_amount, monthly_due, term):
+        """Derive months covered and remaining balance - same rules as the payments page"""
+        contract_amount = contract_amount or Decimal('0.00')
+        deductions = self.total_paid_with_rebates
+        
+        self.contract_amount = contract_amount
+        if monthly_due and term:
+            self.months_covered = min(int(deductions // monthly_due), term)
+        else:
+            self.months_covered = 0
+        self.remaining_balance = max(Decimal('0.00'), contract_amount - deductions)
+    
+    def add_payment(self, payment):
+        """Fold one newly inserted payment into the totals (the row must be locked)"""
+        amount_paid = PaymentRecord._meta.get_field('amount_paid').to_python(payment.amount_paid)
+        rebate_amount = PaymentRecord._meta.get_field('rebate_amount').to_python(payment.rebate_amount)
+        payment_date = PaymentRecord._meta.get_field('payment_date').to_python(payment.payment_date)
+        
+        self.total_paid += amount_paid or Decimal('0.00')
+        self.total_rebates += rebate_amount or Decimal('0.00')
+        self.payment_count += 1
+        if payment_date and (self.last_payment_date is None or payment_date > self.last_payment_date):
+            self.last_payment_date = payment_date
+    
+    @classmethod
+    def locked_for(cls, owner):
+        """The owner's ledger row, locked for this transaction (built from scratch if missing)"""
+        ledger = cls.objects.select_for_update().filter(**{cls.owner_field: owner}).first()
+        return ledger or cls.refresh_for(owner)
+    
+    @classmethod
+    def locked_for_many(cls, owners):
+        """locked_for() for several owners at once - {owner id: ledger}"""
+        owner_ids = [owner.pk for owner in owners]
+        ledgers = {
+            getattr(ledger, f'{cls.owner_field}_id'): ledger
+            for ledger in cls.objects.select_for_update().filter(**{f'{cls.owner_field}__in': owner_ids})
+        }
+        for owner in owners:
+            if owner.pk not in ledgers:
+                ledgers[owner.pk] = cls.refresh_for(owner)
+        return ledgers
+
+
+class CustomerLedger(LedgerBase):
+    """Per-customer payment summary - maintained by PaymentRecord.save()/delete()"""
+    customer = models.OneToOneField(Customer, on_delete=models.CASCADE, primary_key=True, related_name='ledger')
+    # Delivery date + (payments made + 1) months, not capped at the term
+    next_due_date = models.DateField(null=True, blank=True)
+    # Highest PaymentRecord.payment_number so far - the next payment gets this + 1
+    last_payment_number = models.IntegerField(default=0)
+    # Payments made as a percentage of the term - the reports rank customers by it (indexed)
+    completion_percentage = models.DecimalField(max_digits=7, decimal_places=2, default=0)
+    # Copy of customer.status == 'active', so the ranking of the active customers is one index walk
+    customer_active = models.BooleanField(default=True)
+    
+    owner_field = 'customer'
+    PAYMENT_FIELDS = [
+        'total_paid', 'total_rebates', 'payment_count', 'last_payment_date', 'last_payment_number',
+        'months_covered', 'remaining_balance', 'next_due_date', 'completion_percentage', 'updated_at',
+    ]
+    
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['-completion_percentage', 'customer'], condition=models.Q(customer_active=True),
+                name='ledger_active_completion_idx',
+            ),
+        ]
+    
+    def __str__(self):
+        return f"Ledger - {self.customer.customers_name}"
+    
+    def apply_totals(self, totals):
+        super().apply_totals(totals)
+        self.last_payment_number = totals.get('last_payment_number') or 0
+    
+    def add_payment(self, payment):
+        super().add_payment(payment)
+        payment_number = PaymentRecord._meta.get_field('payment_number').to_python(payment.payment_number)
+        self.last_payment_number = max(self.last_payment_number, payment_number or 0)
+    
+    def apply_terms(self, customer):
+        self.apply_contract(
+            (customer.monthly_due or Decimal('0.00')) * (customer.term or 0),
+            customer.monthly_due,
+            customer.term,
+        )
+        # Views assign the raw POST string to date_delivered before saving
+        date_delivered = Customer._meta.get_field('date_delivered').to_python(customer.date_delivered)
+        if date_delivered:
+            self.next_due_date = date_delivered + relativedelta(months=self.payment_count + 1)
+        else:
+            self.next_due_date = None
+        self.completion_percentage = self.completion_for(self.payment_count, customer.term)
+        self.customer_active = customer.status == 'active'
+    
+    @staticmethod
+    def completion_for(payment_count, term):
+        """Payments made per 100 months of term, like the old report query (not capped at 100)"""
+        term = Customer._meta.get_field('term').to_python(term)
+        if not term or term <= 0:
+            return Decimal('0.00')
+        return (Decimal(payment_count * 100) / term).quantize(Decimal('0.01'))
+    
+    @classmethod
+    def refresh_for(cls, customer):
+        """Recalculate one customer's ledger from their payment records"""
+        with transaction.atomic():
+            ledger, _ = cls.objects.select_for_update().get_or_create(customer=customer)
+            totals = PaymentRecord.objects.filter(customer=customer).aggregate(**payment_totals())
+            if customer.status != 'active':
+                # A closed contract's payments may have been moved to the archive
+                totals = combine_payment_totals(
+                    totals, ArchivedPaymentRecord.objects.filter(customer=customer).aggregate(**payment_totals())
+                )
+            ledger.apply_totals(totals)
+            ledger.apply_terms(customer)
+            ledger.save()
+        return ledger
+    
+    @classmethod
+    def sync_terms(cls, customer):
+        """Re-derive balance figures (and the active flag) after the contract terms or status changed"""
+        ledger = cls.objects.filter(customer=customer).first()
+        if ledger is None:
+            return cls.refresh_for(customer)
+        ledger.apply_terms(customer)
+        ledger.save(update_fields=[
+            'contract_amount', 'months_covered', 'remaining_balance', 'next_due_date', 'completion_percentage',
+            'customer_active', 'updated_at',
+        ])
+        return ledger
+    
+    @classmethod
+    def rebuild_all(cls):
+        """Rebuild every customer ledger with one grouped aggregate"""
+        totals = {
+            row.pop('customer'): row
+            for row in PaymentRecord.objects.order_by().values('customer').annotate(**payment_totals())
+        }
+        for row in ArchivedPaymentRecord.objects.order_by().values('customer').annotate(**payment_totals()):
+            customer_id = row.pop('customer')
+            totals[customer_id] = combine_payment_totals(totals.get(customer_id, {}), row)
+        ledgers = []
+        for customer in Customer.objects.all().iterator():
+            ledger = cls(customer=customer)
+            ledger.apply_totals(totals.get(customer.id, {}))
+            ledger.apply_terms(customer)
+            ledgers.append(ledger)
+        
+        with transaction.atomic():
+            cls.objects.all().delete()
+            cls.objects.bulk_create(ledgers, batch_size=500)
+        return len(ledgers)
+
+
+class ItemLedger(LedgerBase):
+    """Per-item payment summary (payments linked to the item) - maintained by PaymentRecord.save()/delete()"""
+    item = models.OneToOneField(CustomerItem, on_delete=models.CASCADE, primary_key=True, related_name='ledger')
+    
+    owner_field = 'item'
+    PAYMENT_FIELDS = [
+        'total_paid', 'total_rebates', 'payment_count', 'last_payment_date',
+        'months_covered', 'remaining_balance', 'updated_at',
+    ]
+    
+    def __str__(self):
+        return f"Ledger - {self.item}"
+    
+    def apply_terms(self, item):
+        self.apply_contract(item.total_contract_amount, item.monthly_due, item.term_months)
+    
+    @classmethod
+    def refresh_for(cls, item):
+        """Recalculate one item's ledger from its payment records"""
+        with transaction.atomic():
+            ledger, _ = cls.objects.select_for_update().get_or_create(item=item)
+            ledger.apply_totals(PaymentRecord.objects.filter(customer_item=item).aggregate(**payment_totals()))
+            ledger.apply_terms(item)
+            ledger.save()
+        return ledger
+    
+    @classmethod
+    def sync_terms(cls, item):
+        """Re-derive balance figures after the item terms changed"""
+        ledger = cls.objects.filter(item=item).first()
+        if ledger is None:
+            return cls.refresh_for(item)
+        ledger.apply_terms(item)
+        ledger.save(update_fields=['contract_amount', 'months_covered', 'remaining_balance', 'updated_at'])
+        return ledger
+    
+    @classmethod
+    def rebuild_all(cls):
+        """Rebuild every item ledger with one grouped aggregate"""
+        totals = {
+            row.pop('customer_item'): row
+            for row in PaymentRecord.objects.filter(customer_item__isnull=False)
+            .order_by().values('customer_item').annotate(**payment_totals())
+        }
+        ledgers = []
+        for item in CustomerItem.objects.all().iterator():
+            ledger = cls(item=item)
+            ledger.apply_totals(totals.get(item.id, {}))
+            ledger.apply_terms(item)
+            ledgers.append(ledger)
+        
+        with transaction.atomic():
+            cls.objects.all().delete()
+            cls.objects.bulk_create(ledgers, batch_size=500)
+        return len(ledgers)
+
+class DailyCollection(models.Model):
+    """Payments per day, method and recorder - maintained by PaymentRecord.save()/delete().
+
+    Dashboards and period reports sum these rows instead of the raw payments.
+    """
+    collection_date = models.DateField()
+    payment_method = models.CharField(max_length=50)
+    # Deleting a recorder drops their rows; CustomUser's post_delete signal rebuilds those days
+    recorded_by = models.ForeignKey(CustomUser, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    payment_count = models.IntegerField(default=0)
+    total_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    total_rebates = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        constraints = [
+            # NULL never equals NULL in a unique index, so payments without a recorder get their own
+            models.UniqueConstraint(
+                fields=['collection_date', 'payment_method', 'recorded_by'],
+                condition=models.Q(recorded_by__isnull=False),
+                name='daily_collection_recorder_uniq',
+            ),
+            models.UniqueConstraint(
+                fields=['collection_date', 'payment_method'],
+                condition=models.Q(recorded_by__isnull=True),
+                name='daily_collection_unrecorded_uniq',
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.collection_date} {self.payment_method}: {self.total_amount}"
+    
+    @staticmethod
+    def key_for(payment):
+        """(collection_date, payment_method, recorded_by_id) of a payment - views may hand over raw POST values"""
+        return (
+            PaymentRecord._meta.get_field('payment_date').to_python(payment.payment_date),
+            payment.payment_method or '',
+            payment.recorded_by_id,
+        )
+    
+    @classmethod
+    def add_payments(cls, payments, sign=1):
+        """Fold payments into their rows (sign=-1 takes them out) - one UPDATE per distinct key"""
+        totals = defaultdict(lambda: [0, Decimal('0.00'), Decimal('0.00')])
+        for payment in payments:
+            row = totals[cls.key_for(payment)]
+            row[0] += 1
+            row[1] += PaymentRecord._meta.get_field('amount_paid').to_python(payment.amount_paid) or Decimal('0.00')
+            row[2] += PaymentRecord._meta.get_field('rebate_amount').to_python(payment.rebate_amount) or Decimal('0.00')
+        
+        now = timezone.now()
+        with transaction.atomic():
+            for (collection_date, payment_method, recorded_by_id), (count, amount, rebates) in totals.items():
+                key = {'collection_date': collection_date, 'payment_method': payment_method, 'recorded_by_id': recorded_by_id}
+                rows = cls.objects.filter(**key)
+                increment = {
+                    'payment_count': models.F('payment_count') + sign * count,
+                    'total_amount': models.F('total_amount') + sign * amount,
+                    'total_rebates': models.F('total_rebates') + sign * rebates,
+                    'updated_at': now,
+                }
+                # Same pattern as TransactionSequence: the UPDATE locks the row for the transaction
+                if not rows.update(**increment):
+                    cls.objects.get_or_create(**key)
+                    rows.update(**increment)
+                if sign < 0:
+                    rows.filter(payment_count__lte=0).delete()
+    
+    @classmethod
+    def remove_payments(cls, payments):
+        cls.add_payments(payments, sign=-1)
+    
+    @staticmethod
+    def _grouped(**filters):
+        """Payments per rollup key - archived ones too, they were collected all the same"""
+        return grouped_payment_history(
+            ['payment_date', 'payment_method', 'recorded_by'],
+            {'count': Count('id'), 'amount': Sum('amount_paid'), 'rebates': Sum('rebate_amount')},
+            **filters
+        )
+    
+    @classmethod
+    def _from_rows(cls, rows):
+        return [
+            cls(
+                collection_date=row['payment_date'],
+                payment_method=row['payment_method'] or '',
+                recorded_by_id=row['recorded_by'],
+                payment_count=row['count'],
+                total_amount=row['amount'] or Decimal('0.00'),
+                total_rebates=row['rebates'] or Decimal('0.00'),
+            )
+            for row in rows
+        ]
+    
+    @classmethod
+    def refresh_dates(cls, dates):
+        """Recalculate the rows of these days from their payments (edits and deleted recorders)"""
+        dates = {day for day in dates if day}
+        if not dates:
+            return
+        with transaction.atomic():
+            cls.objects.filter(collection_date__in=dates).delete()
+            cls.objects.bulk_create(cls._from_rows(cls._grouped(payment_date__in=dates)))
+    
+    @classmethod
+    def rebuild_all(cls, since=None):
+        """Rebuild the rollup with one grouped aggregate (from `since` on, or everything)"""
+        filters = {}
+        rows = cls.objects.all()
+        if since:
+            filters['payment_date__gte'] = since
+            rows = rows.filter(collection_date__gte=since)
+        collections = cls._from_rows(cls._grouped(**filters))
+        with transaction.atomic():
+            rows.delete()
+            cls.objects.bulk_create(collections, batch_size=500)
+        return len(collections)
+
+
+class TransactionSequence(models.Model):
+    """Last transaction number handed out for each month (TXN-YYYY-MM-NNNN)"""
+    year_month = models.CharField(max_length=7, primary_key=True)  # YYYY-MM
+    last_number = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    # Peeked numbers are display-only; allocate() refreshes the cached value on commit
+    PEEK_CACHE_SECONDS = 300
+    
+    def __str__(self):
+        return f"{self.year_month}: {self.last_number}"
+    
+    @staticmethod
+    def format_number(year_month, number):
+        return f"TXN-{year_month}-{number:04d}"
+    
+    @classmethod
+    def allocate(cls, year_month):
+        """Reserve the next number of the month - constant cost, safe under concurrent recorders"""
+        return cls.allocate_block(year_month, 1)[0]
+    
+    @classmethod
+    def allocate_block(cls, year_month, count):
+        """Reserve `count` consecutive numbers of the month with a single increment"""
+        sequence = cls.objects.filter(year_month=year_month)
+        increment = {'last_number': models.F('last_number') + count, 'updated_at': timezone.now()}
+        with transaction.atomic():
+            # The row stays locked by the UPDATE until the surrounding transaction ends
+            if not sequence.update(**increment):
+                cls.objects.get_or_create(year_month=year_month)
+                sequence.update(**increment)
+            last_number = sequence.values_list('last_number', flat=True).get()
+            transaction.on_commit(lambda: cache.set(cls._peek_cache_key(year_month), last_number + 1, cls.PEEK_CACHE_SECONDS))
+        return [cls.format_number(year_month, number) for number in range(last_number - count + 1, last_number + 1)]
+    
+    @classmethod
+    def peek(cls, year_month):
+        """The number the next payment of the month would get, without reserving it"""
+        key = cls._peek_cache_key(year_month)
+        next_number = cache.get(key)
+        if next_number is None:
+            last_number = cls.objects.filter(year_month=year_month).values_list('last_number', flat=True).first()
+            next_number = (last_number or 0) + 1
+            cache.set(key, next_number, cls.PEEK_CACHE_SECONDS)
+        return cls.format_number(year_month, next_number)
+    
+    @staticmethod
+    def _peek_cache_key(year_month):
+        return f'txn-sequence-next:{year_month}'
+    
+    @classmethod
+    def peek_current(cls):
+        """peek() for the current month - what the portal shows as the current transaction number"""
+        return cls.peek(date.today().strftime('%Y-%m'))
+
+
+class CustomerSearchEntry(models.Model):
+    """Denormalized search document per customer - maintained by Customer/CustomerItem.save()"""
+    customer = models.OneToOneField(Customer, on_delete=models.CASCADE, primary_key=True, related_name='search_entry')
+    name = models.CharField(max_length=255)
+    # Address, contact and every item name/model, space separated
+    details = models.TextField(blank=True, default='')
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    # Saving a customer only touches the entry when one of these changed
+    CUSTOMER_FIELDS = {'customers_name', 'address', 'contact', 'item'}
+    
+    def __str__(self):
+        return self.name
+    
+    @staticmethod
+    def document_for(customer, items):
+        """(name, details) of a customer and its CustomerItem rows"""
+        parts = [customer.address, customer.contact, customer.item]
+        for item in items:
+            parts.extend([item.item_name, item.item_model])
+        return customer.customers_name, ' '.join(part for part in parts if part)
+    
+    @classmethod
+    def refresh_for(cls, customer):
+        """Rebuild one customer's entry from the customer and its items"""
+        name, details = cls.document_for(customer, CustomerItem.objects.filter(customer=customer).order_by('id'))
+        entry, _ = cls.objects.update_or_create(customer=customer, defaults={'name': name, 'details': details})
+        return entry
+    
+    @classmethod
+    def rebuild_all(cls):
+        """Rebuild every entry with one query for the customers and one for the items"""
+        items_by_customer = {}
+        for item in CustomerItem.objects.order_by('customer_id', 'id').iterator():
+            items_by_customer.setdefault(item.customer_id, []).append(item)
+        
+        entries = []
+        for customer in Customer.objects.all().iterator():
+            name, details = cls.document_for(customer, items_by_customer.get(customer.id, []))
+            entries.append(cls(customer=customer, name=name, details=details))
+        
+        with transaction.atomic():
+            cls.objects.all().delete()
+            cls.objects.bulk_create(entries, batch_size=500)
+        return len(entries)
+
+
+class ArchivedCustomerItem(models.Model):
+    """CustomerItem rows of closed contracts, moved out of the live table by myapp.archive.
+
+    Same columns and ids as CustomerItem, so restoring copies the rows straight back.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name='archived_items')
+    item_name = models.CharField(max_length=100)
+    item_model = models.CharField(max_length=100)
+    item_description = models.TextField(blank=True, default='')
+    item_price = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    quantity = models.IntegerField(default=1)
+    original_price = models.DecimalField(max_digits=10, decimal_places=2)
+    downpayment = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    good_as_cash = models.CharField(max_length=3, default='no')
+    rebate_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    monthly_due = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    term_months = models.IntegerField(default=0)
+    total_contract_amount = models.DecimalField(max_digits=10, decimal_places=2)
+    purchase_date = models.DateField()
+    contract_start_date = models.DateField()
+    contract_end_date = models.DateField()
+    first_due_date = models.DateField()
+    status = models.CharField(max_length=20, default='active')
+    # Copied as they were - not auto_now, or archiving would restamp them
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    
+    def __str__(self):
+        return f"{self.item_name} {self.item_model} (archived)"
+
+
+class ArchivedPaymentRecord(models.Model):
+    """PaymentRecord rows of closed contracts, moved out of the live table by myapp.archive.
+
+    Same columns and ids as PaymentRecord; grouped_payment_history() reads both tables.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name='archived_payments')
+    customer_item = models.ForeignKey(
+        ArchivedCustomerItem, on_delete=models.CASCADE, null=True, blank=True, related_name='payments'
+    )
+    payment_number = models.IntegerField(null=True, blank=True)
+    payment_date = models.DateField()
+    amount_paid = models.DecimalField(max_digits=10, decimal_places=2)
+    payment_method = models.CharField(max_length=50, default='Cash')
+    transaction_number = models.CharField(max_length=50, unique=True, null=True, blank=True)
+    recorded_by = models.ForeignKey(CustomUser, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    has_rebate = models.BooleanField(default=False)
+    rebate_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    reference_id = models.IntegerField(null=True, blank=True)
+    notes = models.TextField(blank=True)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['customer', 'payment_date'], name='archived_payment_cust_date_idx'),
+            models.Index(fields=['payment_date'], name='archived_payment_date_idx'),
+        ]
+    
+    def __str__(self):
+        return f"Payment #{self.payment_number} - {self.customer_id} (archived)"
+
+
+def grouped_payment_history(keys, aggregates, annotations=None, **filters):
+    """values(*keys).annotate(**aggregates) over the live and the archived payments.
+
+    One UNION ALL query; rows of the same key from both tables are merged - Max() aggregates
+    keep the larger value, the others must be sums or counts and are added up. `annotations`
+    are applied before grouping, so a key can be computed (e.g. a TruncMonth).
+    """
+    grouped = [
+        model.objects.filter(**filters).order_by().annotate(**(annotations or {})).values(*keys).annotate(**aggregates)
+        for model in (PaymentRecord, ArchivedPaymentRecord)
+    ]
+    merged = {}
+    for row in grouped[0].union(grouped[1], all=True):
+        key = tuple(row[name] for name in keys)
+        if key not in merged:
+            merged[key] = row
+            continue
+        for name, aggregate in aggregates.items():
+            if isinstance(aggregate, Max):
+                values = [value for value in (merged[key][name], row[name]) if value is not None]
+                merged[key][name] = max(values, default=None)
+            else:
+                merged[key][name] = (merged[key][name] or 0) + (row[name] or 0)
+    return list(merged.values())
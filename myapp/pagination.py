@@ -0,0 +1,84 @@
+import base64
+import json
+
+from django.db.models import Q
+
+KEYSET_PAGE_SIZE = 50
+# Newest first; id breaks ties between rows created in the same instant
+DEFAULT_ORDERING = ('-created_at', 'id')
+
+
+def _keys(ordering):
+    return [(name.lstrip('-'), name.startswith('-')) for name in ordering]
+
+
+def _json_value(value):
+    # Full isoformat - DjangoJSONEncoder would cut timestamps to milliseconds and skip rows
+    return value.isoformat() if hasattr(value, 'isoformat') else str(value)
+
+
+def encode_cursor(obj, ordering=DEFAULT_ORDERING):
+    """Opaque cursor pointing just past `obj` in `ordering`"""
+    values = [getattr(obj, name) for name, _ in _keys(ordering)]
+    raw = json.dumps(values, default=_json_value)
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, model, ordering=DEFAULT_ORDERING):
+    """Ordering values of a cursor - raises ValueError for anything we did not issue"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        values = json.loads(raw)
+        keys = _keys(ordering)
+        if not isinstance(values, list) or len(values) != len(keys):
+            raise ValueError('wrong number of values')
+        return [model._meta.get_field(name).to_python(value) for (name, _), value in zip(keys, values)]
+    except Exception as error:
+        raise ValueError(f'Invalid cursor: {cursor!r}') from error
+
+
+def _seek(ordering, values):
+    """Rows strictly after `values` in `ordering` (a row-value comparison spelled out as ORs)"""
+    condition = Q()
+    equal = {}
+    for (name, descending), value in zip(_keys(ordering), values):
+        lookup = 'lt' if descending else 'gt'
+        condition |= Q(**equal, **{f'{name}__{lookup}': value})
+        equal[name] = value
+    return condition
+
+
+def keyset_page(queryset, cursor=None, page_size=KEYSET_PAGE_SIZE, ordering=DEFAULT_ORDERING):
+    """One page in `ordering`; seeks past the cursor instead of OFFSET so deep pages cost the same"""
+    if page_size < 1:
+        raise ValueError(f'page_size must be at least 1, not {page_size!r}')
+    queryset = queryset.order_by(*ordering)
+    if cursor:
+        queryset = queryset.filter(_seek(ordering, decode_cursor(cursor, queryset.model, ordering)))
+
+    # One extra row tells us whether there is a next page without a COUNT
+    rows = list(queryset[:page_size + 1])
+    has_next = len(rows) > page_size
+    rows = rows[:page_size]
+    return {
+        'object_list': rows,
+        'has_next': has_next,
+        'next_cursor': encode_cursor(rows[-1], ordering) if has_next else '',
+    }
+
+
+def merged_keyset_page(querysets, cursor=None, page_size=KEYSET_PAGE_SIZE, ordering=DEFAULT_ORDERING):
+    """keyset_page() across querysets whose models share the ordering fields (e.g. live and
+    archived rows), merged in `ordering` - one query per queryset"""
+    pages = [keyset_page(queryset, cursor, page_size, ordering) for queryset in querysets]
+    rows = [row for page in pages for row in page['object_list']]
+    # Stable sorts, least significant key first
+    for name, descending in reversed(_keys(ordering)):
+        rows.sort(key=lambda row: getattr(row, name), reverse=descending)
+    has_next = len(rows) > page_size or any(page['has_next'] for page in pages)
+    rows = rows[:page_size]
+    return {
+        'object_list': rows,
+        'has_next': has_next,
+        'next_cursor': encode_cursor(rows[-1], ordering) if has_next else '',
+    }
@@ -0,0 +1,15 @@
+from datetime import date
+
+from dateutil.relativedelta import relativedelta
+
+
+def month_window(year, month):
+    """Half-open [first day, first day of next month) range of a calendar month"""
+    start = date(year, month, 1)
+    return start, start + relativedelta(months=1)
+
+
+def month_filter(field, year, month):
+    """Index-friendly replacement for `field__year=year, field__month=month`"""
+    start, end = month_window(year, month)
+    return {f'{field}__gte': start, f'{field}__lt': end}
@@ -0,0 +1,215 @@
+import hashlib
+from decimal import Decimal
+
+from dateutil.relativedelta import relativedelta
+from django.core.cache import cache
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from .models import Customer, CustomerLedger, DailyCollection, grouped_payment_history
+from .versioning import bump_versions, current_versions
+
+REPORT_CACHE_SECONDS = 60 * 60 * 24
+PERFORMANCE_LIMIT = 20
+TOP_CUSTOMERS_LIMIT = 10
+
+# Payments bump the stamp of their month, so a report is only retired when its range covers
+# the change. Customer changes (status, terms) touch every report; any payment touches the
+# all-time customer performance table.
+CUSTOMERS_VERSION = 'customers'
+PAYMENTS_VERSION = 'payments'
+# Months with a stamp of their own, counting back from the current one. Earlier months share
+# OLDER_MONTHS and future ones LATER_MONTHS, so a report reads a bounded number of stamps
+# whatever range is typed in.
+MONTH_VERSION_SPAN = 120
+OLDER_MONTHS = 'older-months'
+LATER_MONTHS = 'later-months'
+
+
+def _version_key(name):
+    return f'report-version:{name}'
+
+
+def _year_month(day):
+    return f'{day.year}-{day.month:02d}'
+
+
+def _stamped_months():
+    """First and last month with a stamp of their own"""
+    this_month = timezone.localdate().replace(day=1)
+    return this_month - relativedelta(months=MONTH_VERSION_SPAN - 1), this_month
+
+
+def _month_version(day, first, last):
+    month = day.replace(day=1)
+    if month < first:
+        return OLDER_MONTHS
+    if month > last:
+        return LATER_MONTHS
+    return _year_month(month)
+
+
+def report_months(start, end):
+    """Version names of every month the range touches - at most MONTH_VERSION_SPAN + 2"""
+    first, last = _stamped_months()
+    months = []
+    if start.replace(day=1) < first:
+        months.append(OLDER_MONTHS)
+    month = max(start.replace(day=1), first)
+    while month <= min(end, last):
+        months.append(_year_month(month))
+        month += relativedelta(months=1)
+    if end.replace(day=1) > last:
+        months.append(LATER_MONTHS)
+    return months
+
+
+def _bump(names):
+    bump_versions(_version_key(name) for name in names)
+
+
+def invalidate_reports(*payment_dates):
+    """Retire the cached reports covering these payment dates (and the all-time tables)"""
+    first, last = _stamped_months()
+    _bump({_month_version(day, first, last) for day in payment_dates if day} | {PAYMENTS_VERSION})
+
+
+def invalidate_customer_reports():
+    """Retire every cached report - customer status and terms feed all of them"""
+    _bump([CUSTOMERS_VERSION])
+
+
+def _cache_key(*parts):
+    return 'report:' + hashlib.md5(':'.join(str(part) for part in parts).encode()).hexdigest()
+
+
+def period_report(start, end):
+    """Collections between `start` and `end`.
+
+    The monthly, payment method and overall figures are summed from the DailyCollection rollup
+    (a few rows per day); only the per-customer figures scan the payments (live and archived),
+    grouped by customer.
+    """
+    zero = Decimal('0.00')
+    rows = (
+        DailyCollection.objects.filter(collection_date__range=[start, end])
+        .annotate(month=TruncMonth('collection_date'))
+        .values('month', 'payment_method')
+        .annotate(count=Sum('payment_count'), amount=Sum('total_amount'))
+        .order_by()
+    )
+
+    months = {}
+    methods = {}
+    total_count = 0
+    total_amount = zero
+    for row in rows:
+        count, amount = row['count'], row['amount'] or zero
+        total_count += count
+        total_amount += amount
+
+        month = months.setdefault(row['month'], {'month': row['month'], 'total_payments': 0, 'total_amount': zero})
+        month['total_payments'] += count
+        month['total_amount'] += amount
+
+        method = methods.setdefault(
+            row['payment_method'], {'payment_method': row['payment_method'], 'count': 0, 'total_amount': zero}
+        )
+        method['count'] += count
+        method['total_amount'] += amount
+
+    for month in months.values():
+        month['average_payment'] = month['total_amount'] / month['total_payments']
+    for method in methods.values():
+        method['avg_amount'] = method['total_amount'] / method['count']
+
+    # Closed contracts may have had their payments archived - the period still counts them
+    customers = {
+        row['customer_id']: {'active': row['customer__status'] == 'active', 'count': row['count'], 'amount': row['amount']}
+        for row in grouped_payment_history(
+            ['customer_id', 'customer__status'],
+            {'count': Count('id'), 'amount': Sum('amount_paid')},
+            payment_date__range=[start, end],
+        )
+    }
+
+    return {
+        'monthly_data': sorted(months.values(), key=lambda month: month['month'], reverse=True),
+        'payment_methods': sorted(methods.values(), key=lambda method: method['total_amount'], reverse=True),
+        'total_payments_period': total_count,
+        'total_amount_period': total_amount,
+        'active_customers_period': len(customers),
+        'avg_payment_period': total_amount / total_count if total_count else 0,
+        'top_customers': top_customers(customers),
+    }
+
+
+def top_customers(customers, limit=TOP_CUSTOMERS_LIMIT):
+    """The active customers who paid the most in the period, from period_report()'s per-customer totals"""
+    ranked = sorted(
+        ((totals['amount'], customer_id) for customer_id, totals in customers.items() if totals['active']),
+        key=lambda ranking: (-ranking[0], ranking[1]),
+    )[:limit]
+    by_id = Customer.objects.in_bulk([customer_id for _, customer_id in ranked])
+    top = []
+    for _, customer_id in ranked:
+        customer = by_id[customer_id]
+        customer.payments_made_count = customers[customer_id]['count']
+        customer.total_paid_amount = customers[customer_id]['amount']
+        top.append(customer)
+    return top
+
+
+def _top_ledgers():
+    return CustomerLedger.objects.filter(customer_active=True).select_related('customer').order_by(
+        '-completion_percentage', 'customer'
+    )[:PERFORMANCE_LIMIT]
+
+
+def customer_overview():
+    """All-time figures of the active customers, independent of the report period.
+
+    Driven from CustomerLedger, which stores each customer's completion percentage and whether
+    the customer is active: the top of the table is read off ledger_active_completion_idx in
+    order, without grouping payments or sorting customers. Every customer has a ledger row -
+    Customer.save() creates it (CustomerLedger.sync_terms) and CustomerLedger.rebuild_all()
+    covers every customer.
+    """
+    customer_performance = []
+    for ledger in _top_ledgers():
+        customer = ledger.customer
+        customer.payments_made = ledger.payment_count
+        customer.total_paid = ledger.total_paid
+        customer.total_contract = (customer.monthly_due or Decimal('0.00')) * (customer.term or 0)
+        customer.remaining_balance = customer.total_contract - ledger.total_paid
+        customer.completion_percentage = ledger.completion_percentage
+        customer_performance.append(customer)
+
+    return {
+        'customer_performance': customer_performance,
+        'total_customers': Customer.objects.filter(status='active').count(),
+    }
+
+
+def cached_report(start, end, report_type='overview'):
+    """Everything the reports page shows, cached per (start, end, report_type) and data version.
+
+    A warm report costs two cache round trips (stamps, then sections) and no queries.
+    """
+    customers_version, payments_version, *month_versions = current_versions(
+        [_version_key(name) for name in [CUSTOMERS_VERSION, PAYMENTS_VERSION] + report_months(start, end)]
+    )
+
+    period_key = _cache_key('period', start, end, report_type, customers_version, *month_versions)
+    overview_key = _cache_key('overview', customers_version, payments_version)
+    cached = cache.get_many([period_key, overview_key])
+
+    report = {}
+    for key, build in ((period_key, lambda: period_report(start, end)), (overview_key, customer_overview)):
+        section = cached.get(key)
+        if section is None:
+            section = build()
+            cache.set(key, section, REPORT_CACHE_SECONDS)
+        report.update(section)
+    return report
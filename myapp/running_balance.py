@@ -0,0 +1,111 @@
+from decimal import Decimal
+
+from django.db import connection
+from django.db.models import DecimalField, F, Q, Sum, Value, Window
+from django.db.models.functions import Coalesce
+
+from .pagination import keyset_page, merged_keyset_page
+
+# Payments are applied in this order - the id settles same-day payments
+CHRONOLOGICAL = ('payment_date', 'id')
+
+MONEY = DecimalField(max_digits=12, decimal_places=2)
+
+
+def _deduction():
+    return F('amount_paid') + Coalesce('rebate_amount', Value(Decimal('0.00')), output_field=MONEY)
+
+
+def with_running_totals(queryset):
+    """Annotate each payment with what was paid (+ rebates) up to and including it, overall
+    (`paid_to_date`) and for its item (`item_paid_to_date`), with SUM() OVER windows.
+
+    The windows are evaluated after WHERE but before ORDER BY/LIMIT, so the queryset can be
+    shown newest-first and still carry the chronological totals. A filter that only drops
+    later payments - like the cursor of a newest-first page - leaves every total intact.
+    """
+    order_by = [F(field).asc() for field in CHRONOLOGICAL]
+    return queryset.annotate(
+        paid_to_date=Window(Sum(_deduction(), output_field=MONEY), partition_by=[F('customer')], order_by=order_by),
+        item_paid_to_date=Window(
+            Sum(_deduction(), output_field=MONEY), partition_by=[F('customer_item')], order_by=order_by
+        ),
+    )
+
+
+def running_totals(payments, paid=None, item_paid=None):
+    """Yield `payments` (already in chronological order) with the running totals attached -
+    the in-memory form of with_running_totals(), optionally continuing from totals
+    ({customer id / item id: amount}) paid before them"""
+    paid = dict(paid or {})
+    item_paid = dict(item_paid or {})
+    for payment in payments:
+        deduction = (payment.amount_paid or Decimal('0.00')) + (payment.rebate_amount or Decimal('0.00'))
+        paid[payment.customer_id] = paid.get(payment.customer_id, Decimal('0.00')) + deduction
+        item_paid[payment.customer_item_id] = item_paid.get(payment.customer_item_id, Decimal('0.00')) + deduction
+        payment.paid_to_date = paid[payment.customer_id]
+        payment.item_paid_to_date = item_paid[payment.customer_item_id]
+        yield payment
+
+
+def _attach_in_memory(payments, paid=None, item_paid=None):
+    """running_totals() over a list in any order (the fallback where OVER is unsupported)"""
+    chronological = sorted(payments, key=lambda payment: (payment.payment_date, payment.id))
+    for _ in running_totals(chronological, paid, item_paid):
+        pass
+
+
+def attach_page_running_totals(payments, querysets, has_older=True):
+    """Running totals for one page of a chronologically contiguous slice of `querysets` without
+    OVER: everything before the page is summed in one grouped aggregate per queryset and the
+    page continues from there (skipped when the caller knows the page reaches back to the
+    first payment).
+    """
+    if not payments:
+        return
+    if not has_older:
+        _attach_in_memory(payments)
+        return
+    oldest = min(payments, key=lambda payment: (payment.payment_date, payment.id))
+    older = Q(payment_date__lt=oldest.payment_date) | Q(payment_date=oldest.payment_date, id__lt=oldest.id)
+
+    paid = {}
+    item_paid = {}
+    for queryset in querysets:
+        before = queryset.filter(older).order_by().values('customer', 'customer_item').annotate(
+            total=Sum(_deduction(), output_field=MONEY)
+        )
+        for row in before:
+            paid[row['customer']] = paid.get(row['customer'], Decimal('0.00')) + row['total']
+            item_paid[row['customer_item']] = item_paid.get(row['customer_item'], Decimal('0.00')) + row['total']
+    _attach_in_memory(payments, paid, item_paid)
+
+
+def running_totals_page(querysets, cursor=None, ordering=('-payment_date', '-id')):
+    """A keyset page of payments, newest first, each carrying its running totals.
+
+    `querysets` are the sources of one history (Customer.payment_sources()). A single one is
+    paged in one query with the windows; live and archived payments - or a database without
+    OVER - are paged per source, merged, and continue from one grouped sum of the older
+    payments per source. Raises ValueError for a bad cursor.
+    """
+    if not all(name.startswith('-') for name in ordering):
+        # An oldest-first cursor would drop the earlier payments the windows sum up
+        raise ValueError('running totals pages must be ordered newest first')
+    querysets = list(querysets)
+    if len(querysets) == 1 and connection.features.supports_over_clause:
+        return keyset_page(with_running_totals(querysets[0]), cursor, ordering=ordering)
+    page = merged_keyset_page(querysets, cursor, ordering=ordering)
+    # Newest first, so a next page means older payments exist
+    attach_page_running_totals(page['object_list'], querysets, has_older=page['has_next'])
+    return page
+
+
+def balance_after(payment, total_contract):
+    """Balance left after `payment`: its item's contract for item payments, else the customer's.
+    Payments only ever reduce the balance, so clamping the cumulative figure at zero equals
+    clamping step by step."""
+    if payment.customer_item_id:
+        contract = payment.customer_item.total_contract_amount or Decimal('0.00')
+        return max(Decimal('0.00'), contract - payment.item_paid_to_date)
+    return max(Decimal('0.00'), total_contract - payment.paid_to_date)
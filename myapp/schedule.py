@@ -0,0 +1,103 @@
+from datetime import date
+from decimal import Decimal
+from functools import lru_cache
+
+from dateutil.relativedelta import relativedelta
+from django.core.cache import cache
+
+SCHEDULE_CACHE_SECONDS = 60 * 60 * 24
+
+
+@lru_cache(maxsize=2048)
+def due_dates(start_date, term):
+    """Due dates of a term - the first one falls a month after delivery"""
+    return tuple(start_date + relativedelta(months=month + 1) for month in range(term or 0))
+
+
+class ScheduleEngine:
+    """Monthly payment slots of a contract, filled chronologically by the actual payments"""
+
+    def __init__(self, start_date, term, contract_amount):
+        self.start_date = start_date
+        self.term = term or 0
+        self.contract_amount = contract_amount or Decimal('0.00')
+
+    @classmethod
+    def for_item(cls, item):
+        return cls(item.purchase_date, item.term_months, item.total_contract_amount)
+
+    def build(self, payments, today=None):
+        """Slots for `payments` (chronological) - the n-th payment fills the n-th slot"""
+        return self.with_status(self._slots(payments), today)
+
+    def build_for_item(self, item, payments, today=None):
+        """build() memoized per item; any payment write touches the item ledger and so the key"""
+        key = self._item_cache_key(item)
+        slots = cache.get(key) if key else None
+        if slots is None:
+            slots = self._slots(payments)
+            if key:
+                cache.set(key, slots, SCHEDULE_CACHE_SECONDS)
+        return self.with_status(slots, today)
+
+    def _item_cache_key(self, item):
+        # Unsaved ledgers (no payment ever written) have no stamp to key on
+        stamp = item.ledger_summary.updated_at
+        if stamp is None:
+            return None
+        return f'schedule:item:{item.pk}:{stamp.timestamp()}:{self.start_date}:{self.term}:{self.contract_amount}'
+
+    def _slots(self, payments):
+        slots = []
+        running_balance = self.contract_amount
+        for month, due_date in enumerate(due_dates(self.start_date, self.term)):
+            payment = payments[month] if month < len(payments) else None
+            placeholder_number = f'TXN-{due_date.strftime("%Y-%m")}-{month+1:03d}'
+
+            if payment:
+                rebate_amount = payment.rebate_amount or Decimal('0.00')
+                running_balance -= payment.amount_paid + rebate_amount
+                slots.append({
+                    'transaction_number': payment.transaction_number or placeholder_number,
+                    'due_date': due_date,
+                    'payment_date': payment.payment_date,
+                    'amount_paid': payment.amount_paid,
+                    'payment_method': payment.payment_method or 'Cash',
+                    'rebate_amount': rebate_amount,
+                    'running_balance': max(Decimal('0.00'), running_balance),
+                    'notes': payment.notes or '',
+                    'customer_item_id': payment.customer_item_id,
+                    'created_at': payment.created_at,
+                    'paid': True,
+                })
+            else:
+                # Unpaid slot - the balance does not change
+                slots.append({
+                    'transaction_number': placeholder_number,
+                    'due_date': due_date,
+                    'payment_date': None,
+                    'amount_paid': Decimal('0.00'),
+                    'payment_method': 'Cash',
+                    'rebate_amount': Decimal('0.00'),
+                    'running_balance': running_balance,
+                    'notes': '',
+                    'customer_item_id': None,
+                    'created_at': None,
+                    'paid': False,
+                })
+        return slots
+
+    @staticmethod
+    def with_status(slots, today=None):
+        """Copies of the slots with PAID/OVERDUE/PENDING for `today` (kept out of the cached value)"""
+        today = today or date.today()
+        result = []
+        for slot in slots:
+            if slot['paid']:
+                status = 'PAID'
+            elif slot['due_date'] < today:
+                status = 'OVERDUE'
+            else:
+                status = 'PENDING'
+            result.append({**slot, 'status': status})
+        return result
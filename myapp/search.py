@@ -0,0 +1,177 @@
+import re
+from functools import lru_cache
+
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from .models import Customer, CustomerSearchEntry
+
+ENTRY_TABLE = CustomerSearchEntry._meta.db_table
+FTS_TABLE = 'myapp_customersearch_fts'
+TYPEAHEAD_LIMIT = 10
+
+# Name matches rank above address/contact/item matches
+SQLITE_RANK = f'bm25({FTS_TABLE}, 10.0, 1.0)'
+DOCUMENT = "(name || ' ' || details)"
+PG_VECTOR = f"to_tsvector('simple', {DOCUMENT})"
+PG_RANKED_VECTOR = "setweight(to_tsvector('simple', name), 'A') || setweight(to_tsvector('simple', details), 'D')"
+
+SQLITE_INSTALL = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        name, details, content='{ENTRY_TABLE}', content_rowid='customer_id', tokenize='unicode61'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON {ENTRY_TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, name, details) VALUES (new.customer_id, new.name, new.details);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON {ENTRY_TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, details) VALUES ('delete', old.customer_id, old.name, old.details);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE ON {ENTRY_TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, details) VALUES ('delete', old.customer_id, old.name, old.details);
+        INSERT INTO {FTS_TABLE}(rowid, name, details) VALUES (new.customer_id, new.name, new.details);
+    END""",
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')",
+]
+SQLITE_UNINSTALL = [
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_ai',
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_ad',
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_au',
+    f'DROP TABLE IF EXISTS {FTS_TABLE}',
+]
+
+POSTGRES_INSTALL = [
+    # pg_trgm needs CREATE on the database (PostgreSQL 13+) or a superuser; without it the
+    # substring half of the match still works, only without its index
+    """DO $$ BEGIN
+        CREATE EXTENSION IF NOT EXISTS pg_trgm;
+    EXCEPTION WHEN insufficient_privilege OR undefined_file THEN
+        RAISE NOTICE 'pg_trgm unavailable - customer search substring matches run unindexed';
+    END $$""",
+    f'CREATE INDEX IF NOT EXISTS customer_search_vector_idx ON {ENTRY_TABLE} USING gin ({PG_VECTOR})',
+    # Serves the substring (ILIKE) half of the match, e.g. the middle of a phone number
+    f"""DO $$ BEGIN
+        IF EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm') THEN
+            CREATE INDEX IF NOT EXISTS customer_search_trgm_idx ON {ENTRY_TABLE} USING gin ({DOCUMENT} gin_trgm_ops);
+        END IF;
+    END $$""",
+]
+POSTGRES_UNINSTALL = [
+    'DROP INDEX IF EXISTS customer_search_vector_idx',
+    'DROP INDEX IF EXISTS customer_search_trgm_idx',
+]
+
+
+def install_search_index(db=connection):
+    """Create the vendor's index over CustomerSearchEntry (idempotent - migration 0016 holds a frozen copy)"""
+    statements = {'sqlite': SQLITE_INSTALL, 'postgresql': POSTGRES_INSTALL}.get(db.vendor, [])
+    with db.cursor() as cursor:
+        for statement in statements:
+            cursor.execute(statement)
+    _search_backend.cache_clear()
+
+
+def uninstall_search_index(db=connection):
+    statements = {'sqlite': SQLITE_UNINSTALL, 'postgresql': POSTGRES_UNINSTALL}.get(db.vendor, [])
+    with db.cursor() as cursor:
+        for statement in statements:
+            cursor.execute(statement)
+    _search_backend.cache_clear()
+
+
+@lru_cache(maxsize=None)
+def _search_backend(vendor):
+    """'fts5', 'postgresql' or 'like' - checked once per process, not per search"""
+    if vendor == 'postgresql':
+        return 'postgresql'
+    if vendor == 'sqlite' and FTS_TABLE in connection.introspection.table_names():
+        return 'fts5'
+    return 'like'
+
+
+def search_terms(query):
+    """Words of a search box value - everything else is dropped so it cannot break the MATCH syntax"""
+    return re.findall(r'\w+', query or '')
+
+
+def _substring_pattern(terms):
+    """LIKE pattern for the words as one phrase anywhere in the document ('_' is a word character)"""
+    return '%' + ' '.join(terms).replace('_', r'\_') + '%'
+
+
+def _match_sql(terms):
+    """(sql, params) selecting customer_id and rank of the matching entries, best first
+
+    Word-prefix matches come from the full-text index; the substring match (the middle of a
+    phone number or a name) ranks below them, like the icontains search it replaced.
+    """
+    backend = _search_backend(connection.vendor)
+    if backend == 'fts5':
+        # Prefix match on every word: "juan del" finds "Juan Dela Cruz"
+        match = ' AND '.join(f'"{term}"*' for term in terms)
+        # bm25() is negative for matches, so 0 puts substring-only matches last
+        return (
+            f'SELECT customer_id, MIN(rank) AS rank FROM ('
+            f'SELECT rowid AS customer_id, {SQLITE_RANK} AS rank FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s '
+            f"UNION ALL SELECT customer_id, 0 AS rank FROM {ENTRY_TABLE} WHERE {DOCUMENT} LIKE %s ESCAPE '\\'"
+            f') GROUP BY customer_id ORDER BY rank',
+            [match, _substring_pattern(terms)],
+        )
+    if backend == 'postgresql':
+        tsquery = ' & '.join(f'{term}:*' for term in terms)
+        return (
+            f"SELECT customer_id, ts_rank({PG_RANKED_VECTOR}, to_tsquery('simple', %s)) AS rank "
+            f"FROM {ENTRY_TABLE} WHERE {PG_VECTOR} @@ to_tsquery('simple', %s) OR {DOCUMENT} ILIKE %s "
+            f'ORDER BY rank DESC',
+            [tsquery, tsquery, _substring_pattern(terms)],
+        )
+    return None
+
+
+def _like_entries(terms):
+    entries = CustomerSearchEntry.objects.all()
+    for term in terms:
+        entries = entries.filter(Q(name__icontains=term) | Q(details__icontains=term))
+    return entries
+
+
+def filter_customers(queryset, query):
+    """Restrict a Customer queryset to the search matches (keeps the queryset's own ordering)"""
+    terms = search_terms(query)
+    if not terms:
+        return queryset.none()
+    match = _match_sql(terms)
+    if match is None:
+        return queryset.filter(pk__in=_like_entries(terms).values('customer_id'))
+    sql, params = match
+    return queryset.filter(pk__in=RawSQL(f'SELECT customer_id FROM ({sql}) matches', params))
+
+
+def ranked_customer_ids(query, limit=TYPEAHEAD_LIMIT):
+    """Ids of the best `limit` matches, best first"""
+    terms = search_terms(query)
+    if not terms:
+        return []
+    match = _match_sql(terms)
+    if match is None:
+        return list(_like_entries(terms).order_by('name', 'customer_id').values_list('customer_id', flat=True)[:limit])
+    sql, params = match
+    with connection.cursor() as cursor:
+        cursor.execute(f'{sql} LIMIT %s', params + [limit])
+        return [row[0] for row in cursor.fetchall()]
+
+
+def typeahead(query, limit=TYPEAHEAD_LIMIT):
+    """Ranked matches shaped for the typeahead JSON - two queries whatever the book size"""
+    ids = ranked_customer_ids(query, limit)
+    customers = Customer.objects.in_bulk(ids)
+    return [
+        {
+            'id': customer.id,
+            'name': customer.customers_name,
+            'contact': customer.contact,
+            'address': customer.address,
+            'status': customer.status,
+        }
+        for customer in (customers[pk] for pk in ids if pk in customers)
+    ]
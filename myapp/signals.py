@@ -0,0 +1,81 @@
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from .archive import restore_customer
+from .history import invalidate_history_stats
+from .models import Customer, CustomerHistory, CustomerItem, CustomUser, DailyCollection, PaymentRecord
+from .reports import invalidate_customer_reports, invalidate_reports
+from .summaries import invalidate_customer_summary
+
+
+@receiver(post_save, sender=PaymentRecord)
+@receiver(post_delete, sender=PaymentRecord)
+@receiver(post_save, sender=CustomerItem)
+@receiver(post_delete, sender=CustomerItem)
+def payment_or_item_changed(sender, instance, **kwargs):
+    invalidate_customer_summary(instance.customer_id)
+
+
+@receiver(pre_save, sender=PaymentRecord)
+def remember_payment_date(sender, instance, raw=False, **kwargs):
+    # An edit can move a payment to another month - both months' reports change
+    instance._previous_payment_date = None
+    if instance.pk and not instance._state.adding and not raw:
+        instance._previous_payment_date = (
+            PaymentRecord.objects.filter(pk=instance.pk).values_list('payment_date', flat=True).first()
+        )
+
+
+@receiver(post_save, sender=PaymentRecord)
+@receiver(post_delete, sender=PaymentRecord)
+def payment_changed(sender, instance, **kwargs):
+    # Views may hand over the raw POST date string
+    payment_date = PaymentRecord._meta.get_field('payment_date').to_python(instance.payment_date)
+    invalidate_reports(payment_date, getattr(instance, '_previous_payment_date', None))
+
+
+@receiver(post_delete, sender=PaymentRecord)
+def payment_deleted(sender, instance, **kwargs):
+    # Here rather than in PaymentRecord.delete() so payments deleted along with their
+    # customer or item leave the collections too
+    DailyCollection.remove_payments([instance])
+
+
+@receiver(pre_delete, sender=CustomUser)
+def remember_collection_dates(sender, instance, **kwargs):
+    instance._collection_dates = set(
+        DailyCollection.objects.filter(recorded_by=instance).values_list('collection_date', flat=True)
+    )
+
+
+@receiver(post_delete, sender=CustomUser)
+def recorder_deleted(sender, instance, **kwargs):
+    # The recorder's rows went with them and their payments now have no recorder
+    DailyCollection.refresh_dates(getattr(instance, '_collection_dates', ()))
+
+
+@receiver(post_save, sender=Customer)
+def customer_changed(sender, instance, created=False, raw=False, **kwargs):
+    # Contract terms (monthly due, term, downpayment) feed the summaries too
+    invalidate_customer_summary(instance.pk)
+    # ...and status and terms feed every report
+    invalidate_customer_reports()
+    # A reactivated (restored) contract takes its archived items and payments back. Only a
+    # change to active can have archived rows to restore; instances not loaded from the
+    # database carry no previous status and are checked.
+    previous_status = getattr(instance, '_loaded_status', None)
+    instance._loaded_status = instance.status
+    if instance.status == 'active' and previous_status != 'active' and not created and not raw:
+        restore_customer(instance.pk)
+
+
+@receiver(post_delete, sender=Customer)
+def customer_deleted(sender, instance, **kwargs):
+    invalidate_customer_reports()
+
+
+@receiver(post_save, sender=CustomerHistory)
+@receiver(post_delete, sender=CustomerHistory)
+def history_changed(sender, instance, **kwargs):
+    # Archiving and restoring both go through here
+    invalidate_history_stats()
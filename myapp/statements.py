@@ -0,0 +1,127 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from dateutil.relativedelta import relativedelta
+from django.db.models import CharField, Max, Sum, Value
+from django.db.models.functions import Cast, Concat, LPad, TruncMonth
+from django.utils import timezone
+
+from .models import Customer, MonthlyStatement, grouped_payment_history
+
+STATEMENT_BATCH_SIZE = 1000
+# Everything but the (customer, statement_date) key is rewritten when a month is regenerated
+STATEMENT_UPDATE_FIELDS = [
+    'due_date', 'amount_due', 'amount_paid', 'balance', 'status', 'transaction_number', 'updated_at',
+]
+# The latest payment of a month is found with a Max() over "<payment date><zero-padded id>
+# <transaction number>", so the grouped aggregate can carry its transaction number
+LATEST_KEY_ID_DIGITS = 20
+LATEST_KEY_PREFIX = len('YYYY-MM-DD') + LATEST_KEY_ID_DIGITS
+
+
+def month_start(day):
+    return day.replace(day=1)
+
+
+def month_end(first_day):
+    return first_day + relativedelta(months=1) - timedelta(days=1)
+
+
+def last_closed_month(today=None):
+    """First day of the month before `today`'s"""
+    return month_start(today or timezone.localdate()) - relativedelta(months=1)
+
+
+def latest_statement_month():
+    """Newest generated month - where an incremental run picks up again (None before the first run)"""
+    return MonthlyStatement.objects.aggregate(latest=Max('statement_date'))['latest']
+
+
+def statement_status(amount_due, amount_paid, due_date, today):
+    """Same rules as calculate_monthly_billing()"""
+    if amount_paid >= amount_due:
+        return 'paid'
+    if amount_paid > 0:
+        return 'partial'
+    return 'overdue' if due_date < today else 'unpaid'
+
+
+def latest_payment_key():
+    return Max(Concat(
+        Cast('payment_date', CharField()),
+        LPad(Cast('id', CharField()), LATEST_KEY_ID_DIGITS, Value('0')),
+        'transaction_number',
+        output_field=CharField(),
+    ))
+
+
+def latest_transaction_number(key):
+    return key[LATEST_KEY_PREFIX:] if key else ''
+
+
+def build_statement(customer_id, monthly_due, first_day, amount_paid, transaction_number, today):
+    amount_due = monthly_due or Decimal('0.00')
+    due_date = month_end(first_day)
+    return MonthlyStatement(
+        customer_id=customer_id,
+        statement_date=first_day,
+        due_date=due_date,
+        amount_due=amount_due,
+        amount_paid=amount_paid,
+        balance=amount_due - amount_paid,
+        status=statement_status(amount_due, amount_paid, due_date, today),
+        transaction_number=transaction_number or f'TXN-{first_day.year}-{first_day.month:02d}-0001',
+    )
+
+
+def generate_statements(since=None, through=None, customer_ids=None, today=None):
+    """Upsert the MonthlyStatement rows of the months `since`..`through` (default: the last closed month).
+
+    One grouped aggregate over the live and archived payments gives every (customer, month) with
+    payments; active customers without a payment in the closing month get an unpaid/overdue
+    statement for it. Rows are written with bulk_create(update_conflicts=True), so re-running a
+    month replaces its statements instead of duplicating them. `since=None` covers the whole
+    payment history. Returns the number of statements written.
+    """
+    today = today or timezone.localdate()
+    through = month_start(through or last_closed_month(today))
+    filters = {'payment_date__lt': through + relativedelta(months=1)}
+    customers = Customer.objects.all()
+    if since:
+        filters['payment_date__gte'] = month_start(since)
+    if customer_ids is not None:
+        filters['customer_id__in'] = customer_ids
+        customers = customers.filter(id__in=customer_ids)
+
+    monthly_due = {}
+    active = set()
+    for customer_id, due, status in customers.values_list('id', 'monthly_due', 'status'):
+        monthly_due[customer_id] = due
+        if status == 'active':
+            active.add(customer_id)
+
+    statements = []
+    stated = set()
+    for row in grouped_payment_history(
+        ['customer_id', 'month'],
+        {'amount': Sum('amount_paid'), 'latest': latest_payment_key()},
+        annotations={'month': TruncMonth('payment_date')},
+        **filters,
+    ):
+        stated.add((row['customer_id'], row['month']))
+        statements.append(build_statement(
+            row['customer_id'], monthly_due.get(row['customer_id']), row['month'],
+            row['amount'] or Decimal('0.00'), latest_transaction_number(row['latest']), today,
+        ))
+    for customer_id in active:
+        if (customer_id, through) not in stated:
+            statements.append(build_statement(customer_id, monthly_due[customer_id], through, Decimal('0.00'), '', today))
+
+    MonthlyStatement.objects.bulk_create(
+        statements,
+        batch_size=STATEMENT_BATCH_SIZE,
+        update_conflicts=True,
+        unique_fields=['customer', 'statement_date'],
+        update_fields=STATEMENT_UPDATE_FIELDS,
+    )
+    return len(statements)
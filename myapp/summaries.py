@@ -0,0 +1,102 @@
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncMonth
+
+from .models import grouped_payment_history
+from .versioning import bump_versions, current_version
+
+SUMMARY_CACHE_SECONDS = 60 * 60 * 24
+
+
+def _version_key(customer_id):
+    return f'customer-summary-version:{customer_id}'
+
+
+def _summary_key(customer_id, version):
+    return f'customer-summary:{customer_id}:{version}'
+
+
+def invalidate_customer_summary(*customer_ids):
+    """Retire the cached summaries of these customers"""
+    bump_versions(_version_key(customer_id) for customer_id in customer_ids)
+
+
+def build_customer_summary(customer):
+    """Contract and payment figures shared by the customer portal pages (three queries, four
+    for a closed contract). Payments are read with the archived ones.
+    """
+    zero = Decimal('0.00')
+
+    summary = {
+        'total_paid': zero,
+        'total_rebates': zero,
+        'payment_count': 0,
+        'general_total_paid': zero,
+        'general_payment_count': 0,
+        'items': {},
+        'monthly_paid': {},
+        'monthly_payment_count': {},
+    }
+    for row in grouped_payment_history(
+        ['customer_item'],
+        {'amount': Sum('amount_paid'), 'rebates': Sum('rebate_amount'), 'count': Count('id')},
+        customer=customer,
+    ):
+        amount, rebates = row['amount'] or zero, row['rebates'] or zero
+        summary['total_paid'] += amount
+        summary['total_rebates'] += rebates
+        summary['payment_count'] += row['count']
+        if row['customer_item'] is None:
+            summary['general_total_paid'] = amount + rebates
+            summary['general_payment_count'] = row['count']
+        else:
+            summary['items'][row['customer_item']] = {
+                'total_paid_with_rebates': amount + rebates,
+                'payment_count': row['count'],
+            }
+    summary['total_paid_with_rebates'] = summary['total_paid'] + summary['total_rebates']
+
+    for row in grouped_payment_history(
+        ['month'],
+        {'amount': Sum('amount_paid'), 'count': Count('id')},
+        annotations={'month': TruncMonth('payment_date')},
+        customer=customer,
+    ):
+        year_month = row['month'].strftime('%Y-%m')
+        summary['monthly_paid'][year_month] = row['amount'] or zero
+        summary['monthly_payment_count'][year_month] = row['count']
+
+    # General payments are shared between the active items in proportion to their contracts
+    contracts = {}
+    for source in customer.item_sources():
+        contracts.update(source.filter(status='active').values_list('id', 'total_contract_amount'))
+    items_contract = sum((amount or zero for amount in contracts.values()), zero)
+    general = summary['general_total_paid']
+    allocations = {}
+    for item_id, contract in contracts.items():
+        if len(contracts) > 1 and general > 0 and items_contract > 0:
+            allocations[item_id] = general * (contract or zero) / items_contract
+        else:
+            allocations[item_id] = general
+    summary['has_items'] = bool(contracts)
+    summary['items_contract'] = items_contract
+    summary['allocations'] = allocations
+    return summary
+
+
+def customer_summary(customer):
+    """build_customer_summary() through the cache - repeat visits run no aggregate queries"""
+    key = _summary_key(customer.pk, current_version(_version_key(customer.pk)))
+    summary = cache.get(key)
+    if summary is None:
+        summary = build_customer_summary(customer)
+        cache.set(key, summary, SUMMARY_CACHE_SECONDS)
+    return summary
+
+
+def month_paid(summary, year, month):
+    """(amount paid, payment count) of a calendar month from a summary"""
+    year_month = f'{year}-{month:02d}'
+    return summary['monthly_paid'].get(year_month, Decimal('0.00')), summary['monthly_payment_count'].get(year_month, 0)
@@ -24,11 +24,15 @@ urlpatterns = [
     
     # Customer Management
     path('customers/', views.customers_list, name='customers_list'),
+    path('customers/page/', views.customers_list_page, name='customers_list_page'),
+    path('customers/search/', views.customer_search, name='customer_search'),
+    path('customers/picker/', views.customer_picker, name='customer_picker'),
     path('customers/add/', views.add_customer, name='add_customer'),
     path('customers/<int:customer_id>/', views.customer_detail, name='customer_detail'),
     path('customers/<int:customer_id>/edit/', views.edit_customer, name='edit_customer'),
     path('customers/<int:customer_id>/remove/', views.remove_customer, name='remove_customer'),
     path('customers/<int:customer_id>/payments/', views.customer_payments, name='customer_payments'),
+    path('customers/<int:customer_id>/payments/export/', views.customer_payments_export, name='customer_payments_export'),
     
     # Customer Portal Navigation
     path('customer/transactions/', views.customer_transactions, name='customer_transactions'),
@@ -45,6 +49,7 @@ urlpatterns = [
     # Payment Management
     path('payments/', views.payments, name='payments'),
     path('payments/record/', views.record_payment, name='record_payment'),
+    path('payments/record-batch/', views.record_payment_batch, name='record_payment_batch'),
     
     # API endpoints
     path('api/customer-items/<int:customer_id>/', views.get_customer_items, name='get_customer_items'),
@@ -57,4 +62,7 @@ urlpatterns = [
     # User Management (Admin only)
     path('users/manage/', views.manage_users, name='manage_users'),
     path('run-migrations/', views.run_migrations, name='run_migrations'),
+    
+    # Monitoring (Admin only)
+    path('metrics/requests/', views.request_metrics, name='request_metrics'),
 ]
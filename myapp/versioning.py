@@ -0,0 +1,32 @@
+import uuid
+
+from django.core.cache import cache
+from django.db import transaction
+
+
+def current_versions(keys):
+    """Version stamps stored under `keys` in one get_many() - fresh ones (one set_many()) for any never set or evicted"""
+    stamps = cache.get_many(keys)
+    missing = {key: uuid.uuid4().hex for key in keys if key not in stamps}
+    if missing:
+        # A random stamp (not a counter) so an evicted stamp can never revive old entries.
+        # Overwriting a stamp another worker set in the meantime only retires what it cached
+        # under it, so one set_many() is safe - no add() per key
+        cache.set_many(missing, None)
+        stamps.update(missing)
+    return [stamps.get(key, '') for key in keys]
+
+
+def current_version(key):
+    return current_versions([key])[0]
+
+
+def bump_versions(keys):
+    """Retire everything cached under these stamps - now, and again once the writing transaction commits"""
+    keys = list(keys)
+
+    def bump():
+        cache.set_many({key: uuid.uuid4().hex for key in keys}, None)
+    bump()
+    # A reader between the write and the commit could cache pre-commit figures under the new stamp
+    transaction.on_commit(bump)
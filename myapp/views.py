@@ -1,46 +1,71 @@
 from django.shortcuts import render, redirect, get_object_or_404
-from django.db.models import Q, Sum, Count, F, Case, When
+from django.db.models import Q, Sum, Count, F, Case, When, Prefetch
+from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth import authenticate, login, logout
 from django.utils import timezone
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
+from django.template.loader import render_to_string
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 from decimal import Decimal
 from datetime import datetime, timedelta, date
 from dateutil.relativedelta import relativedelta
+from collections import defaultdict
 import json
 import logging
 import re
+from urllib.parse import urlencode
 from django.core.management import call_command
-from django.db import connection
+from django.core.paginator import Paginator
+from django.db import connection, transaction
 from .models import (
     CustomUser, Customer, PaymentRecord, CustomerItem, 
-    Transaction, MonthlyStatement, UserActivityLog, CustomerHistory
+    Transaction, MonthlyStatement, UserActivityLog, CustomerHistory, TransactionSequence, DailyCollection
 )
 
 from .forms import (
     CustomerRegistrationForm, CustomerForm, PaymentForm, 
     CustomUserCreationForm, CustomUserEditForm
 )
+from .batch_payments import BatchError, parse_batch, validate_batch, record_batch
+from .due_payments import classified_customers, due_payment_stats, filter_by_status, as_report_rows
+from .exports import stream_payments_csv, stream_payments_json
+from .history import HISTORY_STATUSES, history_filters, history_page, history_stats
+from .metrics import metrics_snapshot, query_budget
+from .pagination import keyset_page
+from .periods import month_filter
+from .reports import cached_report
+from .running_balance import balance_after, running_totals_page
+from .schedule import ScheduleEngine
+from .search import TYPEAHEAD_LIMIT, filter_customers, typeahead
+from .summaries import customer_summary, month_paid
+from .dashboard import (
+    admin_dashboard_stats, staff_collection_customers, staff_priority_stats, staff_priority_rows,
+    collection_totals
+)
 
 # Get logger for this module
 logger = logging.getLogger('myapp')
 
-def calculate_monthly_billing(customer, month, year):
+DUE_PAYMENTS_PAGE_SIZE = 50
+PICKER_PAGE_SIZE = 50
+PICKER_ORDERING = ('customers_name', 'id')
+TRANSACTIONS_ORDERING = ('-payment_date', '-id')
+
+def calculate_monthly_billing(customer, month, year, amount_paid=None):
     """Calculate monthly billing information matching PHP calculateMonthlyBilling function"""
     from datetime import datetime
     from dateutil.relativedelta import relativedelta
     
-    # Get payments for this specific month
-    month_payments = PaymentRecord.objects.filter(
-        customer=customer,
-        payment_date__month=month,
-        payment_date__year=year
-    )
-    
-    amount_paid = month_payments.aggregate(total=Sum('amount_paid'))['total'] or Decimal('0.00')
+    # Get payments for this specific month (unless the caller already knows the total)
+    if amount_paid is None:
+        month_payments = PaymentRecord.objects.filter(
+            customer=customer,
+            **month_filter('payment_date', year, month)
+        )
+        amount_paid = month_payments.aggregate(total=Sum('amount_paid'))['total'] or Decimal('0.00')
     
     # Calculate due date (end of month)
     due_date = datetime(year, month, 1) + relativedelta(months=1) - timedelta(days=1)
@@ -72,30 +97,6 @@ def calculate_monthly_billing(customer, month, year):
         'status': status
     }
 
-def generate_transaction_number():
-    """Generate unique transaction number with proper collision handling"""
-    from datetime import datetime
-    from .models import PaymentRecord
-    
-    current_date = datetime.now()
-    year = current_date.year
-    month = current_date.month
-    
-    # Find the next available number to avoid conflicts
-    counter = 1
-    while True:
-        txn_number = f"TXN-{year}-{month:02d}-{counter:04d}"
-        # Check if this transaction number already exists
-        if not PaymentRecord.objects.filter(transaction_number=txn_number).exists():
-            return txn_number
-        counter += 1
-        
-        # Safety check to prevent infinite loop
-        if counter > 9999:
-            # Fallback to timestamp-based number
-            timestamp = current_date.strftime('%H%M%S')
-            return f"TXN-{year}-{month:02d}-{timestamp}"
-
 def get_client_ip(request):
     """Get client IP address"""
     x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
@@ -393,6 +394,7 @@ def register(request):
     
     return render(request, 'auth/user_register.html', {'form': form})
 
+@query_budget(8)
 @login_required
 def admin_dashboard(request):
     """Admin dashboard with comprehensive analytics"""
@@ -400,53 +402,11 @@ def admin_dashboard(request):
         messages.error(request, 'Access denied')
         return redirect('index')
     
-    # Dashboard statistics
-    total_customers = Customer.objects.filter(status='active').count()
-    today = date.today()
-    
-    # Payments due today - simplified calculation
-    payments_due_today = 0
-    for customer in Customer.objects.filter(status='active'):
-        if customer.next_due_date == today:
-            payments_due_today += 1
-    
-    # Today's collections
-    today_payments = PaymentRecord.objects.filter(payment_date=today)
-    today_collections = today_payments.aggregate(total=Sum('amount_paid'))['total'] or Decimal('0.00')
-    today_payment_count = today_payments.count()
-    
-    # This month's revenue
-    month_start = today.replace(day=1)
-    month_revenue = PaymentRecord.objects.filter(
-        payment_date__gte=month_start,
-        payment_date__lte=today
-    ).aggregate(total=Sum('amount_paid'))['total'] or Decimal('0.00')
-    
-    # Overdue customers
-    overdue_customers = []
-    for customer in Customer.objects.filter(status='active'):
-        if customer.is_overdue:
-            overdue_customers.append(customer)
-    
-    # Recent activity
-    recent_payments = PaymentRecord.objects.select_related('customer').order_by('-created_at')[:10]
-    
-    recent_customers = Customer.objects.order_by('-created_at')[:5]
-    
-    context = {
-        'total_customers': total_customers,
-        'payments_due_today': payments_due_today,
-        'today_collections': today_collections,
-        'today_payment_count': today_payment_count,
-        'month_revenue': month_revenue,
-        'overdue_count': len(overdue_customers),
-        'overdue_customers': overdue_customers[:10],
-        'recent_payments': recent_payments,
-        'recent_customers': recent_customers,
-    }
+    context = admin_dashboard_stats()
     
     return render(request, 'dashboard/admin_main_dashboard.html', context)
 
+@query_budget(9)
 @login_required
 def staff_dashboard(request):
     """Staff dashboard focused on collections - matches staff_dashboard.php exactly"""
@@ -470,80 +430,13 @@ def staff_dashboard(request):
         Q(status='active') | Q(status__isnull=True)
     ).count()
     
-    # Get overdue payments count and due soon count - using same logic as PHP
-    overdue_customers = []
-    due_soon_count = 0
-    customers = Customer.objects.filter(
-        Q(status='active') | Q(status__isnull=True)
-    ).exclude(date_delivered__isnull=True)
-    
-    for customer in customers:
-        # Calculate payments made
-        payments_made = PaymentRecord.objects.filter(customer=customer).count()
-        total_paid = PaymentRecord.objects.filter(customer=customer).aggregate(
-            total=Sum('amount_paid'))['total'] or Decimal('0.00')
-        
-        # Skip if fully paid
-        if payments_made >= customer.term:
-            continue
-        
-        # Calculate contract details
-        total_contract = customer.monthly_due * customer.term
-        balance = total_contract - total_paid
-        
-        # Calculate expected payments based on delivery date
-        days_since_delivery = (date.today() - customer.date_delivered).days
-        expected_payments = (days_since_delivery // 30) + 1
-        overdue_payments = max(0, expected_payments - payments_made)
-        
-        # Calculate next due date
-        next_due_date = customer.date_delivered + timedelta(days=30 * (payments_made + 1))
-        days_overdue = max(0, (date.today() - next_due_date).days)
-        
-        # Count due soon (payments due within 7 days but not overdue)
-        if overdue_payments == 0 and days_overdue <= 7 and days_overdue >= -7:
-            due_soon_count += 1
-        
-        # Only include if there are overdue payments
-        if overdue_payments > 0:
-            overdue_customers.append({
-                'customer': customer,
-                'payments_made': payments_made,
-                'expected_payments': expected_payments,
-                'overdue_payments': overdue_payments,
-                'next_due_date': next_due_date,
-                'days_overdue': days_overdue,
-                'balance': balance,
-                'total_contract': total_contract,
-                'total_paid': total_paid
-            })
-    
-    # Sort by overdue payments (highest first), then by days overdue
-    overdue_customers.sort(key=lambda x: (x['overdue_payments'], x['days_overdue']), reverse=True)
-    overdue_count = len(overdue_customers)
-    
-    # Today's collections - matching PHP query - FIXED with try-catch
-    try:
-        today_payments = PaymentRecord.objects.filter(payment_date=date.today())
-    except Exception as e:
-        today_payments = PaymentRecord.objects.none()
-    
-    today_collections = today_payments.aggregate(total=Sum('amount_paid'))['total'] or Decimal('0.00')
-    today_payment_count = today_payments.count()
-    
-    # This month's collections - matching PHP query - FIXED with try-catch
-    current_month = date.today().month
-    current_year = date.today().year
-    try:
-        month_payments = PaymentRecord.objects.filter(
-            payment_date__month=current_month,
-            payment_date__year=current_year
-        )
-    except Exception as e:
-        month_payments = PaymentRecord.objects.none()
+    # Overdue/due soon counts and the top priority customers, computed in SQL
+    collection_customers = staff_collection_customers()
+    priority_stats = staff_priority_stats(collection_customers)
+    priority_customers = staff_priority_rows(collection_customers)
     
-    month_collections = month_payments.aggregate(total=Sum('amount_paid'))['total'] or Decimal('0.00')
-    month_payment_count = month_payments.count()
+    # Today's and this month's collections
+    collections = collection_totals()
     
     # Recent payment history (match Payments page dataset) - FIXED with try-catch
     try:
@@ -557,18 +450,19 @@ def staff_dashboard(request):
         'user': request.user,
         'username': request.user.full_name or request.user.username,
         'total_customers': total_customers,
-        'overdue_count': overdue_count,
-        'due_soon_count': due_soon_count,
-        'priority_customers': overdue_customers[:10],  # Top 10 for priority section
+        'overdue_count': priority_stats['overdue_count'],
+        'due_soon_count': priority_stats['due_soon_count'],
+        'priority_customers': priority_customers,  # Top 10 for priority section
         'recent_payments': recent_payments,
-        'today_collections': today_collections,
-        'today_payment_count': today_payment_count,
-        'month_collections': month_collections,
-        'month_payment_count': month_payment_count,
+        'today_collections': collections['today_collections'],
+        'today_payment_count': collections['today_payment_count'],
+        'month_collections': collections['month_collections'],
+        'month_payment_count': collections['month_payment_count'],
     }
     
     return render(request, 'dashboard/staff_main_dashboard.html', context)
 
+@query_budget(12)
 @login_required
 def customer_dashboard(request):
     """Enhanced customer dashboard - matches customer_dashboard_enhanced.php exactly"""
@@ -588,13 +482,16 @@ def customer_dashboard(request):
     
     # Get customer information
     try:
-        customer = Customer.objects.get(id=customer_id)
+        customer = Customer.objects.select_related('ledger').get(id=customer_id)
     except Customer.DoesNotExist:
         context = {
             'customer': None,
         }
         return render(request, 'dashboard/customer_main_dashboard.html', context)
     
+    # Cached payment figures - invalidated whenever a payment or item of the customer changes
+    summary = customer_summary(customer)
+    
     # Calculate current month payment due as the sum of monthly dues for ALL active items
     current_month = timezone.now().month
     current_year = timezone.now().year
@@ -617,14 +514,12 @@ def customer_dashboard(request):
     # Check if there are payments this month
     current_month_payments = PaymentRecord.objects.filter(
         customer=customer,
-        payment_date__month=current_month,
-        payment_date__year=current_year
+        **month_filter('payment_date', current_year, current_month)
     )
+    month_amount_paid, month_payment_count = month_paid(summary, current_year, current_month)
     
-    if current_month_payments.exists():
-        monthly_amount_paid = current_month_payments.aggregate(
-            total=Sum('amount_paid')
-        )['total'] or Decimal('0.00')
+    if month_payment_count:
+        monthly_amount_paid = month_amount_paid
         monthly_remaining = max(Decimal('0.00'), current_month_total_due - monthly_amount_paid).quantize(Decimal('1'), rounding='ROUND_HALF_UP')
         
         if monthly_remaining <= 0:
@@ -640,26 +535,22 @@ def customer_dashboard(request):
         'status': monthly_status
     }
     
-    # Get current month transaction number
-    current_transaction_number = generate_transaction_number()
+    # Get current month transaction number (peeked from the sequence, never reserved)
+    current_transaction_number = TransactionSequence.peek_current()
     
     # Get customer items from customer_items table (multiple items support)
     customer_items = CustomerItem.objects.filter(
         customer=customer, 
         status='active'
-    ).order_by('-purchase_date')
+    ).select_related('ledger').order_by('-purchase_date')
     
     # Calculate contract details first (enhanced calculation logic)
     all_payments = PaymentRecord.objects.filter(customer=customer)
     
-    # Calculate total paid including rebates from payment records
-    payment_totals = all_payments.aggregate(
-        total_payments=Sum('amount_paid'),
-        total_rebates=Sum('rebate_amount')
-    )
-    
-    total_paid = (payment_totals['total_payments'] or Decimal('0.00')) + (payment_totals['total_rebates'] or Decimal('0.00'))
-    payments_made = all_payments.count()
+    # Total paid including rebates, read from the customer ledger summary
+    customer_ledger = customer.ledger_summary
+    total_paid = customer_ledger.total_paid_with_rebates
+    payments_made = customer_ledger.payment_count
     
     # Enhanced calculation logic
     downpayment = customer.downpayment or Decimal('0.00')
@@ -684,27 +575,16 @@ def customer_dashboard(request):
     # Calculate payments remaining
     payments_remaining = max(0, customer.term - payments_made)
     
+    # General payments (not linked to any specific item) - identical for every item
+    general_total_paid = summary['general_total_paid']
+    general_payment_count = summary['general_payment_count']
+    
     # Universal payment allocation system for ALL customers
     for item in customer_items:
-        # Get item-specific payments (payments linked to this specific item)
-        item_payments = PaymentRecord.objects.filter(customer=customer, customer_item=item)
-        item_payment_totals = item_payments.aggregate(
-            total_payments=Sum('amount_paid'),
-            total_rebates=Sum('rebate_amount')
-        )
-        
-        # Calculate item-specific totals
-        item_total_paid = (item_payment_totals['total_payments'] or Decimal('0.00')) + (item_payment_totals['total_rebates'] or Decimal('0.00'))
-        item_payments_made = item_payments.count()
-        
-        # Get general payments (not linked to any specific item)
-        general_payments = PaymentRecord.objects.filter(customer=customer, customer_item__isnull=True)
-        general_payment_totals = general_payments.aggregate(
-            total_payments=Sum('amount_paid'),
-            total_rebates=Sum('rebate_amount')
-        )
-        
-        general_total_paid = (general_payment_totals['total_payments'] or Decimal('0.00')) + (general_payment_totals['total_rebates'] or Decimal('0.00'))
+        # Item-specific totals (payments linked to this specific item) from the item ledger
+        item_ledger = item.ledger_summary
+        item_total_paid = item_ledger.total_paid_with_rebates
+        item_payments_made = item_ledger.payment_count
         
         # Calculate item proportion for both payment allocation and rebate calculation
         item_proportion = item.total_contract_amount / total_contract if total_contract > 0 else Decimal('1.00')
@@ -720,17 +600,12 @@ def customer_dashboard(request):
         item.item_specific_paid = item_total_paid
         item.general_allocation = item_general_allocation
         item.total_paid = item_total_paid + item_general_allocation
-        item.payments_made = item_payments_made + general_payments.count()
+        item.payments_made = item_payments_made + general_payment_count
         
-        # Calculate item-specific remaining balance using running balance from payment records
-        # Get the final running balance from the last payment record for this item
-        item_last_payment = PaymentRecord.objects.filter(customer=customer, customer_item=item).order_by('payment_date', 'id').last()
-        if item_last_payment and hasattr(item_last_payment, 'running_balance'):
-            item.remaining_balance = item_last_payment.running_balance
-        else:
-            # Fallback: Contract - (Payments + Rebates)
-            item_total_due = item.total_contract_amount
-            item.remaining_balance = max(Decimal('0.00'), item.total_contract_amount - item.total_paid).quantize(Decimal('1'), rounding='ROUND_HALF_UP')
+        # Item remaining balance: Contract - (Payments + Rebates)
+        # (payment records carry no stored running balance)
+        item_total_due = item.total_contract_amount
+        item.remaining_balance = max(Decimal('0.00'), item.total_contract_amount - item.total_paid).quantize(Decimal('1'), rounding='ROUND_HALF_UP')
         
         # Ensure contract amount is calculated correctly (not relying on potentially incorrect database values)
         calculated_contract = item.monthly_due * item.term_months if item.monthly_due and item.term_months else Decimal('0.00')
@@ -881,8 +756,11 @@ def customer_dashboard(request):
         'average_payment': average_payment,
     }
     
-    # Use the already calculated current month payments
-    this_month_payments = current_month_payments.order_by('-payment_date')
+    # Use the already calculated current month payments (no query when the summary says there are none)
+    if month_payment_count:
+        this_month_payments = current_month_payments.order_by('-payment_date')
+    else:
+        this_month_payments = PaymentRecord.objects.none()
 
     # Prepare a small recent payment history list for the dashboard
     recent_payments = all_payments.order_by('-payment_date', '-id')[:5]
@@ -902,6 +780,7 @@ def customer_dashboard(request):
     
     return render(request, 'dashboard/customer_main_dashboard.html', context)
 
+@query_budget(8)
 @login_required
 def customer_transactions(request):
     """Customer transactions view - matches customer_transactions.php"""
@@ -916,23 +795,16 @@ def customer_transactions(request):
         return redirect('customer_dashboard')
     
     try:
-        customer = Customer.objects.get(id=customer_id)
+        customer = Customer.objects.select_related('ledger').get(id=customer_id)
     except Customer.DoesNotExist:
         messages.error(request, 'Customer not found')
         return redirect('customer_dashboard')
     
-    # Get all payment records for this customer (newest first)
-    payments = PaymentRecord.objects.filter(customer=customer).order_by('-payment_date', '-id')
-    
-    # Calculate summary data (payments and rebates)
-    payment_totals = payments.aggregate(
-        total_payments=Sum('amount_paid'),
-        total_rebates=Sum('rebate_amount')
-    )
-    total_paid = payment_totals['total_payments'] or Decimal('0.00')  # For display in summary card
-    total_paid_with_rebates = (payment_totals['total_payments'] or Decimal('0.00')) + \
-                              (payment_totals['total_rebates'] or Decimal('0.00'))
-    payment_count = payments.count()
+    # Summary data (payments and rebates) from the cached customer summary
+    summary = customer_summary(customer)
+    total_paid = summary['total_paid']  # For display in summary card
+    total_paid_with_rebates = summary['total_paid_with_rebates']
+    payment_count = summary['payment_count']
     
     # Calculate average payment (based on amount_paid only)
     average_payment = Decimal('0.00')
@@ -940,9 +812,8 @@ def customer_transactions(request):
         average_payment = total_paid / payment_count
 
     # Compute overall contract and remaining balance (mirrors customer dashboard logic in simplified form)
-    customer_items = CustomerItem.objects.filter(customer=customer, status='active')
-    if customer_items.exists():
-        total_contract = sum((item.total_contract_amount or Decimal('0.00')) for item in customer_items)
+    if summary['has_items']:
+        total_contract = summary['items_contract']
     else:
         total_contract = (customer.monthly_due or Decimal('0.00')) * (customer.term or 0)
 
@@ -950,44 +821,26 @@ def customer_transactions(request):
     if remaining_balance < Decimal('0.00'):
         remaining_balance = Decimal('0.00')
 
-    # Calculate per-item running balances so they match My Items → Payment Breakdown
-    per_payment_balance = {}
-    items_for_balance = CustomerItem.objects.filter(customer=customer)
-    for item in items_for_balance:
-        item_contract = item.total_contract_amount or Decimal('0.00')
-        running_balance_item = item_contract
-        item_payments = PaymentRecord.objects.filter(
-            customer=customer,
-            customer_item=item
-        ).order_by('payment_date', 'id')
-
-        for p in item_payments:
-            total_deduction = (p.amount_paid or Decimal('0.00')) + (p.rebate_amount or Decimal('0.00'))
-            running_balance_item -= total_deduction
-            if running_balance_item < Decimal('0.00'):
-                running_balance_item = Decimal('0.00')
-            per_payment_balance[p.id] = running_balance_item
-
-    # Also compute a global running balance for general payments (no specific item)
-    running_balance_global = total_contract
-    payments_chrono = PaymentRecord.objects.filter(customer=customer).order_by('payment_date', 'id')
-    for p in payments_chrono:
-        total_deduction = (p.amount_paid or Decimal('0.00')) + (p.rebate_amount or Decimal('0.00'))
-        running_balance_global -= total_deduction
-        if running_balance_global < Decimal('0.00'):
-            running_balance_global = Decimal('0.00')
-
-        # Only assign global balance for payments that don't already have an item-specific balance
-        if p.id not in per_payment_balance:
-            per_payment_balance[p.id] = running_balance_global
-
-    # Attach balance-after-payment to each payment object used in the template
+    # One page of payments, newest first, each carrying the chronological totals paid up to it.
+    # Item payments run down their item's contract so they match My Items → Payment Breakdown;
+    # general payments run down the overall contract. A closed contract's history may be archived.
+    try:
+        page = running_totals_page(
+            [source.select_related('customer_item', 'recorded_by') for source in customer.payment_sources()],
+            request.GET.get('cursor', ''),
+            ordering=TRANSACTIONS_ORDERING,
+        )
+    except ValueError:
+        return redirect('customer_transactions')
+    payments = page['object_list']
     for payment in payments:
-        payment.item_running_balance = per_payment_balance.get(payment.id)
+        payment.item_running_balance = balance_after(payment, total_contract)
     
     context = {
         'customer': customer,
         'payments': payments,
+        'page': page,
+        'latest_payment_date': customer.ledger_summary.last_payment_date,
         'total_paid': total_paid,
         'payment_count': payment_count,
         'average_payment': average_payment,
@@ -996,6 +849,7 @@ def customer_transactions(request):
     
     return render(request, 'customer/transactions.html', context)
 
+@query_budget(8)
 @login_required
 def customer_items(request):
     """Customer items view - matches customer_items.php"""
@@ -1010,61 +864,42 @@ def customer_items(request):
         return redirect('customer_dashboard')
     
     try:
-        customer = Customer.objects.get(id=customer_id)
+        customer = Customer.objects.select_related('ledger').get(id=customer_id)
     except Customer.DoesNotExist:
         messages.error(request, 'Customer not found')
         return redirect('customer_dashboard')
     
     # Get customer items from customer_items table
-    customer_items = CustomerItem.objects.filter(
+    customer_items = list(CustomerItem.objects.filter(
         customer=customer, 
         status='active'
-    ).order_by('-purchase_date')
-    
-    # Apply the same payment calculation logic as in customer_dashboard
-    all_payments = PaymentRecord.objects.filter(customer=customer)
-    payment_totals = all_payments.aggregate(
-        total_payments=Sum('amount_paid'),
-        total_rebates=Sum('rebate_amount')
+    ).select_related('ledger').order_by('-purchase_date'))
+    
+    # Every payment of the customer in one query, grouped in memory by item
+    # (chronological, with the id as a stable tie-breaker)
+    all_payments = list(
+        PaymentRecord.objects.filter(customer=customer)
+        .select_related('customer_item')
+        .order_by('payment_date', 'id')
     )
+    payments_by_item = defaultdict(list)
+    for payment in all_payments:
+        payments_by_item[payment.customer_item_id].append(payment)
     
-    total_paid_all = (payment_totals['total_payments'] or Decimal('0.00')) + (payment_totals['total_rebates'] or Decimal('0.00'))
-    payments_made_all = all_payments.count()
+    # Apply the same payment calculation logic as in customer_dashboard (ledger summary)
+    customer_ledger = customer.ledger_summary
+    total_paid_all = customer_ledger.total_paid_with_rebates
+    payments_made_all = customer_ledger.payment_count
     
-    # Calculate total contract for proportional distribution
-    if customer_items:
-        total_contract = sum(item.total_contract_amount or Decimal('0.00') for item in customer_items)
-    else:
-        total_contract = Decimal('0.00')
+    # General payments (not linked to any specific item), shared out in proportion to the
+    # item contracts - precomputed in the cached customer summary
+    summary = customer_summary(customer)
     
     # Apply payment calculations to each item
     for item in customer_items:
-        # Get item-specific payments
-        item_payments = PaymentRecord.objects.filter(customer=customer, customer_item=item)
-        item_payment_totals = item_payments.aggregate(
-            total_payments=Sum('amount_paid'),
-            total_rebates=Sum('rebate_amount')
-        )
-        
-        item_total_paid = (item_payment_totals['total_payments'] or Decimal('0.00')) + (item_payment_totals['total_rebates'] or Decimal('0.00'))
-        
-        # Get general payments (not linked to any specific item)
-        general_payments = PaymentRecord.objects.filter(customer=customer, customer_item__isnull=True)
-        general_payment_totals = general_payments.aggregate(
-            total_payments=Sum('amount_paid'),
-            total_rebates=Sum('rebate_amount')
-        )
-        
-        general_total_paid = (general_payment_totals['total_payments'] or Decimal('0.00')) + (general_payment_totals['total_rebates'] or Decimal('0.00'))
-        
-        # Calculate item proportion for general payment allocation
-        item_proportion = item.total_contract_amount / total_contract if total_contract > 0 else Decimal('1.00')
-        
-        # Distribute general payments proportionally
-        if len(customer_items) > 1 and general_total_paid > 0:
-            item_general_allocation = general_total_paid * item_proportion
-        else:
-            item_general_allocation = general_total_paid
+        # Item-specific totals from the item ledger
+        item_total_paid = item.ledger_summary.total_paid_with_rebates
+        item_general_allocation = summary['allocations'].get(item.id, summary['general_total_paid'])
         
         # Set final item payment data
         item.total_paid = item_total_paid + item_general_allocation
@@ -1082,14 +917,9 @@ def customer_items(request):
         # Store months-based counts so the customer view matches the admin view
         item.payments_made = full_months_paid
         
-        # Calculate remaining balance using running balance from payment records
-        # Get the final running balance from the last payment record for this item
-        item_last_payment = PaymentRecord.objects.filter(customer=customer, customer_item=item).order_by('payment_date', 'id').last()
-        if item_last_payment and hasattr(item_last_payment, 'running_balance'):
-            item.remaining_balance = item_last_payment.running_balance
-        else:
-            # Fallback: Contract - (Payments + Rebates)
-            item.remaining_balance = max(Decimal('0.00'), item.total_contract_amount - item.total_paid).quantize(Decimal('1'), rounding='ROUND_HALF_UP')
+        # Remaining balance: Contract - (Payments + Rebates)
+        # (payment records carry no stored running balance)
+        item.remaining_balance = max(Decimal('0.00'), item.total_contract_amount - item.total_paid).quantize(Decimal('1'), rounding='ROUND_HALF_UP')
         
         # Ensure contract amount is calculated correctly (not relying on potentially incorrect database values)
         calculated_contract = item.monthly_due * item.term_months if item.monthly_due and item.term_months else Decimal('0.00')
@@ -1111,68 +941,11 @@ def customer_items(request):
     
     # Generate payment breakdown for each item (matching admin payment history logic)
     for item in customer_items:
-        # Generate payment records using the same logic as admin payment history
-        payment_records = []
-        start_date = item.purchase_date  # Delivery date
-        
-        # Get actual payments for this item
-        actual_payments = PaymentRecord.objects.filter(customer=customer, customer_item=item).order_by('payment_date')
-        actual_payment_index = 0
-        
-        running_balance = item.total_contract_amount
-        
-        for month in range(item.term_months):
-            # Calculate due date (first payment due one month after delivery)
-            from dateutil.relativedelta import relativedelta as rd
-            due_date = start_date + rd(months=month + 1)
-            
-            # Find matching actual payment (chronologically)
-            actual_payment = None
-            if actual_payment_index < len(actual_payments):
-                actual_payment = actual_payments[actual_payment_index]
-                actual_payment_index += 1
-            
-            # Create payment record
-            if actual_payment:
-                # Use actual payment data
-                payment_amount = actual_payment.amount_paid
-                rebate_amount = actual_payment.rebate_amount or Decimal('0.00')
-                total_deduction = payment_amount + rebate_amount
-                running_balance -= total_deduction
-                
-                payment_record = {
-                    'transaction_number': actual_payment.transaction_number or f'TXN-{due_date.strftime("%Y-%m")}-{month+1:03d}',
-                    'due_date': due_date,
-                    'payment_date': actual_payment.payment_date,
-                    'amount_paid': payment_amount,
-                    'payment_method': actual_payment.payment_method or 'Cash',
-                    'rebate_amount': rebate_amount,
-                    'running_balance': max(Decimal('0.00'), running_balance),
-                    'notes': actual_payment.notes or '',
-                    'status': 'PAID',
-                    'created_at': actual_payment.created_at,
-                }
-            else:
-                # Generate unpaid payment slot; determine if it is overdue or just pending
-                today = timezone.now().date()
-                # due_date is already a date object, so compare it directly
-                is_overdue = due_date < today
-                payment_status = 'OVERDUE' if is_overdue else 'PENDING'
-
-                payment_record = {
-                    'transaction_number': f'TXN-{due_date.strftime("%Y-%m")}-{month+1:03d}',
-                    'due_date': due_date,
-                    'payment_date': None,
-                    'amount_paid': Decimal('0.00'),
-                    'payment_method': 'Cash',
-                    'rebate_amount': Decimal('0.00'),
-                    'running_balance': running_balance,
-                    'notes': '',
-                    'status': payment_status,
-                    'created_at': None,
-                }
-            
-            payment_records.append(payment_record)
+        # Payment schedule from the shared engine (memoized per item)
+        actual_payments = payments_by_item[item.id]
+        payment_records = ScheduleEngine.for_item(item).build_for_item(
+            item, actual_payments, today=timezone.now().date()
+        )
         
         # Attach payment records to item
         item.payment_records = payment_records
@@ -1183,13 +956,8 @@ def customer_items(request):
         # Apply a tiny tolerance to avoid floating/rounding artifacts.
         show_remaining_row = False
         if item.monthly_due and getattr(item, 'remaining_balance', None) and item.remaining_balance > 0:
-            # Ensure we fetch the true last payment chronologically with a stable tie-breaker
-            last_payment = (
-                PaymentRecord.objects
-                .filter(customer=customer, customer_item=item)
-                .order_by('payment_date', 'id')
-                .last()
-            )
+            # The grouped payments are already chronological with a stable tie-breaker
+            last_payment = actual_payments[-1] if actual_payments else None
 
             if last_payment is not None:
                 last_deduction = (last_payment.amount_paid or Decimal('0.00')) + (last_payment.rebate_amount or Decimal('0.00'))
@@ -1278,16 +1046,6 @@ def customer_items(request):
     payment_percentage = (total_payments_made / total_term_months * 100) if total_term_months > 0 else 0
     
     # Generate payment breakdown with proper due dates (same as admin view)
-    from dateutil.relativedelta import relativedelta
-    from datetime import datetime
-    import calendar
-    
-    # Get actual payment records
-    actual_payments = PaymentRecord.objects.filter(customer=customer).order_by('payment_date')
-    
-    # Generate payment schedule with due dates
-    payment_records = []
-    
     # Determine start date for payment schedule
     if customer_items:
         # Use the earliest item delivery date
@@ -1310,56 +1068,9 @@ def customer_items(request):
         admin_total_contract = customer.monthly_due * customer.term
         admin_term = customer.term
     
-    running_balance = admin_total_contract
-    actual_payment_index = 0
-    
-    for month in range(admin_term):
-        # Calculate due date (first payment due one month after delivery)
-        due_date = start_date + relativedelta(months=month + 1)
-        
-        # Find matching actual payment (chronologically)
-        actual_payment = None
-        if actual_payment_index < len(actual_payments):
-            actual_payment = actual_payments[actual_payment_index]
-            actual_payment_index += 1
-        
-        # Create payment record
-        if actual_payment:
-            # Use actual payment data
-            payment_amount = actual_payment.amount_paid
-            rebate_amount = actual_payment.rebate_amount or Decimal('0.00')
-            total_deduction = payment_amount + rebate_amount
-            running_balance -= total_deduction
-            
-            payment_record = type('PaymentRecord', (), {
-                'transaction_number': actual_payment.transaction_number or f'TXN-{due_date.strftime("%Y-%m")}-{month+1:03d}',
-                'due_date': due_date,
-                'payment_date': actual_payment.payment_date,
-                'amount_paid': payment_amount,
-                'payment_method': actual_payment.payment_method or 'Cash',
-                'rebate_amount': rebate_amount,
-                'running_balance': max(Decimal('0.00'), running_balance),
-                'notes': actual_payment.notes or '',
-                'customer_item': actual_payment.customer_item
-            })()
-        else:
-            # Generate pending payment (NOT YET PAID - amount should be 0)
-            payment_record = type('PaymentRecord', (), {
-                'transaction_number': f'TXN-{due_date.strftime("%Y-%m")}-{month+1:03d}',
-                'due_date': due_date,
-                'payment_date': None,
-                'amount_paid': Decimal('0.00'),  # NOT PAID YET - show 0
-                'payment_method': 'Cash',
-                'rebate_amount': Decimal('0.00'),
-                'running_balance': running_balance,  # Balance doesn't change for unpaid
-                'notes': '',
-                'customer_item': None
-            })()
-        
-        payment_records.append(payment_record)
+    payment_records = ScheduleEngine(start_date, admin_term, admin_total_contract).build(all_payments)
 
     # Calculate admin-style summary (same as admin payment history)
-    all_payments = PaymentRecord.objects.filter(customer=customer)
     admin_total_paid = sum(payment.amount_paid for payment in all_payments)
     admin_total_paid_with_rebates = sum(payment.amount_paid + (payment.rebate_amount or Decimal('0.00')) for payment in all_payments)
     
@@ -1378,14 +1089,8 @@ def customer_items(request):
     # The admin shows PHP 6,549 as the final balance in the payment table
     # This is the running balance after all payments and rebates
     
-    # Get the final running balance from the last payment record
-    last_payment = all_payments.order_by('payment_date', 'id').last()
-    if last_payment and hasattr(last_payment, 'running_balance'):
-        # Use the running balance from the last payment record
-        admin_balance = last_payment.running_balance
-    else:
-        # Fallback to calculation: Contract - (Payments + Rebates)
-        admin_balance = admin_contract - admin_total_paid_with_rebates
+    # Payment records carry no stored running balance: Contract - (Payments + Rebates)
+    admin_balance = admin_contract - admin_total_paid_with_rebates
     
     # Ensure all customer items use correct calculated contract amounts
     # Fix any contract amount discrepancies in the database
@@ -1450,6 +1155,7 @@ def customer_items(request):
     
     return render(request, 'customer/items.html', context)
 
+@query_budget(8)
 @login_required
 def monthly_statements(request):
     """Monthly statements view - matches monthly_statements.php exactly"""
@@ -1467,92 +1173,42 @@ def monthly_statements(request):
     except Customer.DoesNotExist:
         return redirect('customer_dashboard')
     
-    monthly_statements = []
+    # Closed months come precomputed by the generate_statements job (one indexed read)
+    statements = list(MonthlyStatement.objects.filter(customer=customer).order_by('-statement_date')[:12])
     
-    # Check if monthly_statements table exists (matching PHP table check)
-    from django.db import connection
-    with connection.cursor() as cursor:
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='myapp_monthlystatement'")
-        table_exists = cursor.fetchone()
-    
-    if table_exists:
-        # Get from monthly_statements table if it exists
-        statements = MonthlyStatement.objects.filter(customer=customer) \
-            .order_by('-statement_date')[:12]
-        
-        for statement in statements:
-            monthly_statements.append({
-                'statement_month': statement.statement_date.month,
-                'statement_year': statement.statement_date.year,
-                'month_name': statement.statement_date.strftime('%B'),
-                'total_due': statement.amount_due,
-                'amount_paid': statement.amount_paid,
-                'remaining_balance': statement.balance,
-                'due_date': statement.due_date,
-                'status': statement.status,
-                'transaction_number': f"TXN-{statement.statement_date.year}-{statement.statement_date.month:02d}-0001"
-            })
+    # The open month has no statement yet - bill it from the cached summary (no queries on a hit)
+    today = timezone.localdate()
+    current_month = today.replace(day=1)
+    if not statements or statements[0].statement_date < current_month:
+        amount_paid, _ = month_paid(customer_summary(customer), today.year, today.month)
+        billing = calculate_monthly_billing(customer, today.month, today.year, amount_paid=amount_paid)
+        statements.insert(0, MonthlyStatement(
+            customer=customer,
+            statement_date=current_month,
+            due_date=billing['due_date'],
+            amount_due=billing['total_due'],
+            amount_paid=billing['amount_paid'],
+            balance=billing['remaining_balance'],
+            status=billing['status'],
+        ))
+        statements = statements[:12]
     
-    # If no monthly statements table or no data, generate from payment_records (matching PHP logic)
-    if not monthly_statements:
-        # Get months that have actual transactions or payments
-        from django.db.models.functions import TruncMonth, Extract
-        months_with_payments = PaymentRecord.objects.filter(customer=customer) \
-            .annotate(
-                year=Extract('payment_date', lookup_name='year'),
-                month=Extract('payment_date', lookup_name='month')
-            ) \
-            .values('year', 'month') \
-            .distinct() \
-            .order_by('-year', '-month')[:12]
-        
-        for month_data in months_with_payments:
-            month = month_data['month']
-            year = month_data['year']
-            
-            # Use calculateMonthlyBilling for accurate data (matching PHP)
-            billing = calculate_monthly_billing(customer, month, year)
-            
-            # Get transaction number for this month
-            month_payments = PaymentRecord.objects.filter(
-                customer=customer,
-                payment_date__month=month,
-                payment_date__year=year
-            ).exclude(transaction_number__isnull=True).order_by('-payment_date')
-            
-            transaction_number = f"TXN-{year}-{month:02d}-0001"
-            if month_payments.exists():
-                transaction_number = month_payments.first().transaction_number or transaction_number
-            
-            monthly_statements.append({
-                'statement_month': month,
-                'statement_year': year,
-                'month_name': billing['due_date'].strftime('%B'),
-                'total_due': billing['total_due'],
-                'amount_paid': billing['amount_paid'],
-                'remaining_balance': billing['remaining_balance'],
-                'due_date': billing['due_date'],
-                'status': billing['status'],
-                'transaction_number': transaction_number
-            })
-        
-        # If still no data, show current month only (matching PHP fallback)
-        if not monthly_statements:
-            current_month = timezone.now().month
-            current_year = timezone.now().year
-            billing = calculate_monthly_billing(customer, current_month, current_year)
-            
-            monthly_statements.append({
-                'statement_month': current_month,
-                'statement_year': current_year,
-                'month_name': timezone.now().strftime('%B'),
-                'total_due': billing['total_due'],
-                'amount_paid': billing['amount_paid'],
-                'remaining_balance': billing['remaining_balance'],
-                'due_date': billing['due_date'],
-                'status': billing['status'],
-                'transaction_number': generate_transaction_number()
-            })
+    monthly_statements = []
+    for statement in statements:
+        monthly_statements.append({
+            'statement_month': statement.statement_date.month,
+            'statement_year': statement.statement_date.year,
+            'month_name': statement.statement_date.strftime('%B'),
+            'total_due': statement.amount_due,
+            'amount_paid': statement.amount_paid,
+            'remaining_balance': statement.balance,
+            'due_date': statement.due_date,
+            'status': statement.status,
+            'transaction_number': (
+                statement.transaction_number
+                or f"TXN-{statement.statement_date.year}-{statement.statement_date.month:02d}-0001"
+            )
+        })
     
     # Log activity (matching PHP)
     UserActivityLog.objects.create(
@@ -1577,6 +1233,7 @@ def monthly_statements(request):
     
     return render(request, 'customer/statements.html', context)
 
+@query_budget(5)
 @login_required
 def customers_list(request):
     """Customer management list - matches original arjensystem exactly"""
@@ -1783,100 +1440,137 @@ def customers_list(request):
             else:
                 messages.error(request, error_message)
     
-    # Get customers with their items - matches original arjensystem GROUP_CONCAT logic
-    from django.db.models import Max
-    from .models import CustomerItem
-    
     search_query = request.GET.get('search', '').strip()
-    
-    # Build base queryset with annotations (equivalent to GROUP_CONCAT)
-    customers_query = Customer.objects.filter(status='active').annotate(
-        # Count of items per customer
-        item_count=Count('items', filter=Q(items__status='active')),
-        # Sum of monthly dues from all items
-        total_monthly_due=Sum('items__monthly_due', filter=Q(items__status='active')),
-        # Sum of total contract amounts from all items
-        total_contract_value=Sum('items__total_contract_amount', filter=Q(items__status='active')),
-        # Latest purchase date
-        latest_purchase=Max('items__purchase_date', filter=Q(items__status='active'))
-    ).prefetch_related('items')
-    
-    # Search functionality (enhanced to include items and models like original PHP)
-    if search_query:
-        customers_query = customers_query.filter(
-            Q(customers_name__icontains=search_query) |
-            Q(address__icontains=search_query) |
-            Q(contact__icontains=search_query) |
-            Q(item__icontains=search_query) |
-            Q(items__item_name__icontains=search_query) |
-            Q(items__item_model__icontains=search_query)
-        ).distinct()
-    
-    customers_query = customers_query.order_by('-created_at')
-    
-    # Process customers to add item details (equivalent to GROUP_CONCAT)
-    customers_with_items = []
-    for customer in customers_query:
-        # Get active items for this customer
-        active_items = customer.items.filter(status='active').order_by('-purchase_date')
-        
-        # Add active items to customer object for template access
-        customer.active_items = active_items
-        
-        # Create item strings (equivalent to GROUP_CONCAT) for backward compatibility
-        all_items = ', '.join([item.item_name for item in active_items])
-        all_models = ', '.join([item.item_model for item in active_items])
-        all_prices = ', '.join([str(item.original_price) for item in active_items])
-        all_monthly_due = ', '.join([str(item.monthly_due) for item in active_items])
-        all_terms = ', '.join([str(item.term_months) for item in active_items])
-        all_totals = ', '.join([str(item.total_contract_amount) for item in active_items])
-        
-        # Add calculated fields to customer object
-        customer.all_items = all_items or customer.item or 'No items'
-        customer.all_models = all_models or 'N/A'
-        customer.all_prices = all_prices or 'N/A'  # Use N/A since Customer model doesn't have original_price
-        customer.all_monthly_due = all_monthly_due or str(customer.monthly_due or 0)
-        customer.all_terms = all_terms or str(customer.term or 0)
-        customer.all_totals = all_totals or str((customer.monthly_due or 0) * (customer.term or 0))
-        
-        # Use annotated values or fallback to customer fields
-        customer.calculated_total_monthly_due = customer.total_monthly_due or customer.monthly_due or 0
-        
-        # Gross Price Formula: (Term × Monthly Payment) + Downpayment
-        monthly_payment = customer.monthly_due or 0
-        term = customer.term or 0
-        downpayment = customer.downpayment or 0
-        customer.calculated_gross_price = (term * monthly_payment) + downpayment
-        
-        customers_with_items.append(customer)
-    
+    customers_query = customer_list_queryset(search_query)
+
+    # First page only - the rest is fetched by customers_list_page as the user scrolls
+    page = keyset_page(customers_query)
+
     context = {
-        'customers': customers_with_items,
+        'customers': page['object_list'],
+        'page': page,
         'search_query': search_query,
-        'search_results_count': len(customers_with_items) if search_query else None,
+        'search_results_count': customers_query.count() if search_query else None,
     }
     
     return render(request, 'customers/customers_list.html', context)
 
+def customer_list_queryset(search_query=''):
+    """Active customers for the list page with their active items prefetched in one query"""
+    from .models import CustomerItem
+
+    customers_query = Customer.objects.filter(status='active').prefetch_related(
+        Prefetch(
+            'items',
+            queryset=CustomerItem.objects.filter(status='active').order_by('-purchase_date'),
+            to_attr='active_items',
+        )
+    )
+
+    # Name, address, contact, items and models - one indexed lookup, no join or DISTINCT
+    if search_query:
+        customers_query = filter_customers(customers_query, search_query)
+    return customers_query
+
+@query_budget(5)
+@login_required
+def customer_search(request):
+    """Typeahead: best matching customers for the search box as JSON"""
+    if request.user.role not in ['admin', 'staff']:
+        return JsonResponse({'success': False, 'message': 'Access denied'}, status=403)
+
+    try:
+        limit = max(1, min(int(request.GET.get('limit', TYPEAHEAD_LIMIT)), 50))
+    except ValueError:
+        limit = TYPEAHEAD_LIMIT
+    return JsonResponse({
+        'success': True,
+        'results': typeahead(request.GET.get('q', ''), limit),
+    })
+
+@query_budget(5)
+@login_required
+def customers_list_page(request):
+    """Next page of customer rows for the list's "Load more" button"""
+    if request.user.role not in ['admin', 'staff']:
+        return JsonResponse({'success': False, 'message': 'Access denied'}, status=403)
+
+    customers_query = customer_list_queryset(request.GET.get('search', '').strip())
+    try:
+        page = keyset_page(customers_query, request.GET.get('cursor', ''))
+    except ValueError:
+        return JsonResponse({'success': False, 'message': 'Invalid cursor'}, status=400)
+
+    html = render_to_string(
+        'includes/customer_rows.html', {'customers': page['object_list']}, request=request
+    )
+    return JsonResponse({
+        'success': True,
+        'html': html,
+        'has_next': page['has_next'],
+        'next_cursor': page['next_cursor'],
+    })
+
+@query_budget(4)
+@login_required
+def customer_picker(request):
+    """Customer options for the payment/item forms, one page at a time (?q= word-prefix search)"""
+    if request.user.role not in ['admin', 'staff']:
+        return JsonResponse({'success': False, 'message': 'Access denied'}, status=403)
+
+    customers_query = Customer.objects.filter(status='active').only(
+        'id', 'customers_name', 'contact', 'address', 'monthly_due'
+    ).annotate(
+        active_item_count=Count('items', filter=Q(items__status='active'))
+    )
+    query = request.GET.get('q', '').strip()
+    if query:
+        customers_query = filter_customers(customers_query, query)
+
+    try:
+        limit = max(1, min(int(request.GET.get('limit', PICKER_PAGE_SIZE)), 100))
+        page = keyset_page(customers_query, request.GET.get('cursor', ''), limit, PICKER_ORDERING)
+    except ValueError:
+        return JsonResponse({'success': False, 'message': 'Invalid cursor or limit'}, status=400)
+
+    return JsonResponse({
+        'success': True,
+        'results': [
+            {
+                'id': customer.id,
+                'name': customer.customers_name,
+                'contact': customer.contact,
+                'address': customer.address,
+                'monthly_due': str(customer.monthly_due),
+                'active_item_count': customer.active_item_count,
+            }
+            for customer in page['object_list']
+        ],
+        'has_next': page['has_next'],
+        'next_cursor': page['next_cursor'],
+    })
+
+@login_required
+def request_metrics(request):
+    """Rolling per-view percentiles from RequestMetricsMiddleware (this worker process only)"""
+    if request.user.role != 'admin':
+        return JsonResponse({'success': False, 'message': 'Access denied'}, status=403)
+
+    return JsonResponse({
+        'success': True,
+        'enabled': settings.REQUEST_METRICS_ENABLED,
+        'slow_ms': settings.REQUEST_METRICS_SLOW_MS,
+        'views': metrics_snapshot(),
+    })
+
 @login_required
 def add_item_modal_content(request):
     """Add item to customer modal content - matches original arjensystem exactly"""
     if request.user.role not in ['admin', 'staff']:
         return JsonResponse({'success': False, 'message': 'Access denied'})
     
-    # Get customers with item counts (max 3 items per customer)
+    # Customer options are loaded lazily from customer_picker (max 3 items per customer)
     from .models import CustomerItem
-    customers = []
-    for customer in Customer.objects.filter(status='active').order_by('customers_name'):
-        # Count current active items
-        current_items = CustomerItem.objects.filter(customer=customer, status='active').count()
-        customers.append({
-            'id': customer.id,
-            'customers_name': customer.customers_name,
-            'address': customer.address,
-            'contact': customer.contact,
-            'current_items': current_items
-        })
         
     if request.method == 'POST':
             
@@ -1988,7 +1682,6 @@ def add_item_modal_content(request):
     # Return modal HTML content for GET requests
     from datetime import date
     return render(request, 'modals/add_item_modal_content.html', {
-        'customers': customers,
         'today': date.today().strftime('%Y-%m-%d')
     })
 
@@ -2154,6 +1847,7 @@ def add_customer(request):
     
     return render(request, 'customers/add.html', {'form': form})
 
+@query_budget(6)
 @login_required
 def payments(request):
     """Main payments page with tabs - matches original arjensystem"""
@@ -2161,17 +1855,13 @@ def payments(request):
         messages.error(request, 'Access denied')
         return redirect('index')
     
-    # Get payment statistics
-    total_payments_data = PaymentRecord.objects.aggregate(
-        count=Count('id'),
-        total=Sum('amount_paid')
-    )
-    
-    today_payments_data = PaymentRecord.objects.filter(
-        payment_date=date.today()
-    ).aggregate(
-        count=Count('id'),
-        total=Sum('amount_paid')
+    # Get payment statistics (all-time and today's) from the daily collections rollup
+    today_only = Q(collection_date=date.today())
+    collection_stats = DailyCollection.objects.aggregate(
+        count=Sum('payment_count'),
+        total=Sum('total_amount'),
+        today_count=Sum('payment_count', filter=today_only),
+        today_total=Sum('total_amount', filter=today_only),
     )
     
     # Get recent payments for history tab
@@ -2243,23 +1933,17 @@ def payments(request):
         except Exception as e:
             messages.error(request, f'Error deleting payment: {str(e)}')
     
-    # Get customers for record payment tab (only active)
-    customers = Customer.objects.filter(
-        Q(status='active') | Q(status__isnull=True)
-    ).order_by('customers_name')
-    
     # Get payment records for display (only from active customers)
     payment_records = PaymentRecord.objects.select_related('customer').filter(
         customer__status__in=['active', None]
     ).order_by('-created_at')[:50]
     
     context = {
-        'total_payments_count': total_payments_data['count'] or 0,
-        'total_payments_amount': total_payments_data['total'] or 0,
-        'today_payments_count': today_payments_data['count'] or 0,
-        'today_payments_amount': today_payments_data['total'] or 0,
+        'total_payments_count': collection_stats['count'] or 0,
+        'total_payments_amount': collection_stats['total'] or 0,
+        'today_payments_count': collection_stats['today_count'] or 0,
+        'today_payments_amount': collection_stats['today_total'] or 0,
         'recent_payments': recent_payments,
-        'customers': customers,
         'payment_records': payment_records,
     }
     
@@ -2385,13 +2069,62 @@ def record_payment(request):
         else:
             print("POST request received but 'add_payment' not found in POST data")
     
-    # Get customers for dropdown - only active customers
-    customers = Customer.objects.filter(status='active').order_by('customers_name')
+    # The customer dropdown loads its options from customer_picker
+    return render(request, 'payments/record_payment.html')
+
+@login_required
+@require_http_methods(["POST"])
+def record_payment_batch(request):
+    """Record a collector's end-of-day receipts at once - JSON body or CSV upload, all or nothing"""
+    if request.user.role not in ['admin', 'staff']:
+        return JsonResponse({'success': False, 'error': 'Access denied'}, status=403)
+    
+    try:
+        payments, errors = validate_batch(parse_batch(request))
+    except BatchError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+    
+    # Nothing is written unless every row is valid
+    if errors:
+        return JsonResponse({
+            'success': False,
+            'error': 'No payments were recorded. Fix the listed rows and upload the batch again.',
+            'errors': errors
+        }, status=400)
+    
+    with transaction.atomic():
+        customers = record_batch(payments, recorded_by=request.user)
+        
+        # Fully-paid archival once per customer instead of once per receipt
+        moved = [customer for customer in customers if check_and_move_fully_paid_customer(customer, request.user)]
+        
+        total_amount = sum(payment.amount_paid for payment in payments)
+        UserActivityLog.objects.create(
+            user=request.user,
+            action='Record Payment Batch',
+            model_name='PaymentRecord',
+            description=f'Recorded {len(payments)} payments for {len(customers)} customers, Amount: PHP {total_amount}',
+            ip_address=get_client_ip(request)
+        )
     
-    return render(request, 'payments/record_payment.html', {
-        'customers': customers
+    return JsonResponse({
+        'success': True,
+        'recorded': len(payments),
+        'total_amount': str(total_amount),
+        'moved_to_history': [customer.id for customer in moved],
+        'payments': [
+            {
+                'row': row,
+                'id': payment.id,
+                'customer_id': payment.customer_id,
+                'payment_number': payment.payment_number,
+                'transaction_number': payment.transaction_number
+            }
+            for row, payment in enumerate(payments, start=1)
+        ]
     })
 
+@query_budget(6)
 @login_required
 def due_payments_report(request):
     """Due payments report - matches original arjensystem exactly"""
@@ -2402,99 +2135,23 @@ def due_payments_report(request):
     # Get filter parameters (same as original PHP)
     filter_status = request.GET.get('status', 'all')
     
-    # Get all active customers with payment calculations (same logic as original PHP)
-    customers_data = []
-    stats = {
-        'total_customers': 0,
-        'overdue_customers': 0,
-        'due_soon_customers': 0,
-        'current_customers': 0,
-        'total_overdue_amount': 0
-    }
-    
-    for customer in Customer.objects.filter(status='active'):
-        if not customer.date_delivered or not customer.monthly_due:
-            continue
-            
-        # Count payments made
-        payments_made = PaymentRecord.objects.filter(customer=customer).count()
-        total_paid = PaymentRecord.objects.filter(customer=customer).aggregate(
-            total=Sum('amount_paid')
-        )['total'] or 0
-        
-        # Calculate expected payments (same as original PHP)
-        from datetime import date
-        days_since_delivery = (date.today() - customer.date_delivered).days
-        expected_payments = max(0, (days_since_delivery // 30) + 1)
-        
-        # Calculate overdue payments
-        overdue_payments = max(0, expected_payments - payments_made)
-        
-        # Calculate next due date (same as original PHP)
-        from dateutil.relativedelta import relativedelta
-        next_due_date = customer.date_delivered + relativedelta(months=payments_made + 1)
-        
-        # Calculate days overdue (same as original PHP)
-        days_until_due = (next_due_date - date.today()).days
-        days_overdue = max(0, -days_until_due) if days_until_due < 0 else 0
-        
-        # Calculate balance
-        total_contract = (customer.monthly_due * customer.term) if customer.term else 0
-        balance = total_contract - total_paid
-        
-        # Determine status (same logic as original PHP)
-        if days_until_due < 0:
-            status = 'overdue'
-            status_class = 'status-overdue'
-            status_text = 'Overdue'
-            stats['overdue_customers'] += 1
-            stats['total_overdue_amount'] += customer.monthly_due * overdue_payments
-        elif 0 <= days_until_due <= 7:
-            status = 'due_soon'
-            status_class = 'status-due-soon'
-            status_text = 'Due Soon'
-            stats['due_soon_customers'] += 1
-        else:
-            status = 'current'
-            status_class = 'status-current'
-            status_text = 'Current'
-            stats['current_customers'] += 1
-        
-        customer_data = {
-            'customer': customer,
-            'payments_made': payments_made,
-            'expected_payments': expected_payments,
-            'overdue_payments': overdue_payments,
-            'next_due_date': next_due_date,
-            'days_overdue': days_overdue,
-            'days_until_due': days_until_due,
-            'balance': balance,
-            'status': status,
-            'status_class': status_class,
-            'status_text': status_text,
-            'total_paid': total_paid
-        }
-        
-        # Apply filters (same as original PHP)
-        if filter_status == 'all' or \
-           (filter_status == 'overdue' and status == 'overdue') or \
-           (filter_status == 'due_soon' and status == 'due_soon') or \
-           (filter_status == 'current' and status == 'current'):
-            customers_data.append(customer_data)
-        
-        stats['total_customers'] += 1
+    # Classification, status filter and sort all run in SQL over the ledger summaries
+    classified = classified_customers()
+    stats = due_payment_stats(classified)
     
-    # Sort by overdue payments desc, then days overdue desc (same as original PHP)
-    customers_data.sort(key=lambda x: (x['overdue_payments'], x['days_overdue']), reverse=True)
+    paginator = Paginator(filter_by_status(classified, filter_status), DUE_PAYMENTS_PAGE_SIZE)
+    page_obj = paginator.get_page(request.GET.get('page'))
     
     context = {
-        'customers_data': customers_data,
+        'customers_data': as_report_rows(page_obj),
         'stats': stats,
         'filter_status': filter_status,
+        'page_obj': page_obj,
     }
     
     return render(request, 'reports/due_payments.html', context)
 
+@query_budget(6)
 @login_required
 def customer_history(request):
     """Customer history page - matches original arjensystem exactly"""
@@ -2643,27 +2300,27 @@ def customer_history(request):
         except Customer.DoesNotExist:
             messages.error(request, 'Customer not found.')
     
+    # One keyset page per tab, filtered by name/transaction prefix and completion date;
+    # `tab` + `cursor` page through one tab while the other shows its newest rows
+    filters = history_filters(request.GET)
+    active_tab = request.GET.get('tab')
+    if active_tab not in HISTORY_STATUSES:
+        active_tab = 'fully_paid'
+    cursor = request.GET.get('cursor', '')
+    
     # Get history data (with fallback if table doesn't exist)
     try:
-        # Build querysets
-        fully_paid_qs = CustomerHistory.objects.filter(final_status='fully_paid').order_by('-completion_date')
-        pulled_out_qs = CustomerHistory.objects.filter(final_status='pulled_out').order_by('-completion_date')
-        
-        # Force evaluation inside try so DB errors are caught here (e.g., missing table in prod)
-        fully_paid_customers = list(fully_paid_qs)
-        pulled_out_customers = list(pulled_out_qs)
-        
-        # Get statistics (also evaluated here)
-        stats = CustomerHistory.objects.aggregate(
-            fully_paid_count=Count('id', filter=Q(final_status='fully_paid')),
-            pulled_out_count=Count('id', filter=Q(final_status='pulled_out')),
-            fully_paid_total=Sum('total_payments', filter=Q(final_status='fully_paid')),
-            pulled_out_total=Sum('total_payments', filter=Q(final_status='pulled_out'))
-        )
+        pages = {
+            status: history_page(status, filters, cursor if status == active_tab else None)
+            for status in HISTORY_STATUSES
+        }
+        stats = history_stats()
+    except ValueError:
+        return redirect('customer_history')
     except Exception:
         # Fallback if CustomerHistory table doesn't exist yet
-        fully_paid_customers = []
-        pulled_out_customers = []
+        empty_page = {'object_list': [], 'has_next': False, 'next_cursor': ''}
+        pages = {status: empty_page for status in HISTORY_STATUSES}
         stats = {
             'fully_paid_count': 0,
             'pulled_out_count': 0,
@@ -2671,14 +2328,26 @@ def customer_history(request):
             'pulled_out_total': 0
         }
     
+    # Filter parameters carried over by the pager links
+    filter_query = urlencode({
+        name: value for name, value in request.GET.items() if name in ('q', 'transaction', 'date_from', 'date_to') and value
+    })
+    
     context = {
-        'fully_paid_customers': fully_paid_customers,
-        'pulled_out_customers': pulled_out_customers,
+        'fully_paid_customers': pages['fully_paid']['object_list'],
+        'pulled_out_customers': pages['pulled_out']['object_list'],
+        'fully_paid_page': pages['fully_paid'],
+        'pulled_out_page': pages['pulled_out'],
+        'active_tab': active_tab,
+        'paged': bool(cursor),
+        'filters': filters,
+        'filter_query': filter_query,
         'stats': stats,
     }
     
     return render(request, 'reports/customer_history.html', context)
 
+@query_budget(6)
 @login_required
 def reports(request):
     """Reports dashboard - matches original arjensystem structure exactly"""
@@ -2686,96 +2355,24 @@ def reports(request):
         messages.error(request, 'Access denied')
         return redirect('index')
     
-    # Import additional required functions
-    from django.db.models import Avg, DecimalField, Value
-    from django.db.models.functions import Coalesce, TruncMonth
-    from datetime import datetime, date
-    
     # Get date range parameters (matches original)
     start_date = request.GET.get('start_date', date.today().replace(day=1).strftime('%Y-%m-%d'))
     end_date = request.GET.get('end_date', date.today().strftime('%Y-%m-%d'))
     report_type = request.GET.get('report_type', 'overview')
     
-    # Convert to datetime objects for queries
     try:
-        start_datetime = datetime.strptime(start_date, '%Y-%m-%d')
-        end_datetime = datetime.strptime(end_date, '%Y-%m-%d')
-    except:
-        start_datetime = date.today().replace(day=1)
-        end_datetime = date.today()
-    
-    # Monthly collection report (matches original query structure)
-    monthly_data = PaymentRecord.objects.filter(
-        payment_date__range=[start_datetime, end_datetime]
-    ).annotate(
-        month=TruncMonth('payment_date')
-    ).values('month').annotate(
-        total_payments=Count('id'),
-        total_amount=Sum('amount_paid'),
-        average_payment=Avg('amount_paid')
-    ).order_by('-month')
-    
-    # Payment method analysis (matches original)
-    payment_methods = PaymentRecord.objects.filter(
-        payment_date__range=[start_datetime, end_datetime]
-    ).values('payment_method').annotate(
-        count=Count('id'),
-        total_amount=Sum('amount_paid'),
-        avg_amount=Avg('amount_paid')
-    ).order_by('-total_amount')
-    
-    # Customer performance report (matches original complex query)
-    customer_performance = Customer.objects.filter(
-        status='active'
-    ).annotate(
-        payments_made=Count('payment_records'),
-        total_paid=Coalesce(Sum('payment_records__amount_paid'), Value(0), output_field=DecimalField(max_digits=10, decimal_places=2)),
-        total_contract=F('monthly_due') * F('term'),
-        remaining_balance=F('monthly_due') * F('term') - Coalesce(Sum('payment_records__amount_paid'), Value(0), output_field=DecimalField(max_digits=10, decimal_places=2)),
-        completion_percentage=Case(
-            When(term__gt=0, then=(Count('payment_records') * 100.0 / F('term'))),
-            default=Value(0),
-            output_field=DecimalField(max_digits=5, decimal_places=2)
-        )
-    ).order_by('-completion_percentage')[:20]
-    
-    # Overall statistics (matches original)
-    total_customers = Customer.objects.filter(status='active').count()
-    total_payments_period = PaymentRecord.objects.filter(
-        payment_date__range=[start_datetime, end_datetime]
-    ).count()
-    total_amount_period = PaymentRecord.objects.filter(
-        payment_date__range=[start_datetime, end_datetime]
-    ).aggregate(total=Sum('amount_paid'))['total'] or 0
-    active_customers_period = PaymentRecord.objects.filter(
-        payment_date__range=[start_datetime, end_datetime]
-    ).values('customer').distinct().count()
-    avg_payment_period = PaymentRecord.objects.filter(
-        payment_date__range=[start_datetime, end_datetime]
-    ).aggregate(avg=Avg('amount_paid'))['avg'] or 0
-    
-    # Top performing customers (matches original)
-    top_customers = Customer.objects.filter(
-        status='active',
-        payment_records__payment_date__range=[start_datetime, end_datetime]
-    ).annotate(
-        payments_made_count=Count('payment_records'),  # FIXED: Renamed to avoid conflict with @property
-        total_paid_amount=Sum('payment_records__amount_paid')  # FIXED: Renamed to avoid conflict
-    ).order_by('-total_paid_amount')[:10]
+        start = datetime.strptime(start_date, '%Y-%m-%d').date()
+        end = datetime.strptime(end_date, '%Y-%m-%d').date()
+    except ValueError:
+        start = date.today().replace(day=1)
+        end = date.today()
     
+    # Period figures from one grouped scan, cached until a payment in the range changes
     context = {
         'start_date': start_date,
         'end_date': end_date,
         'report_type': report_type,
-        'monthly_data': monthly_data,
-        'payment_methods': payment_methods,
-        'customer_performance': customer_performance,
-        'total_customers': total_customers,
-        'total_payments_period': total_payments_period,
-        'total_amount_period': total_amount_period,
-        'active_customers_period': active_customers_period,
-        'avg_payment_period': avg_payment_period,
-        'top_customers': top_customers,
+        **cached_report(start, end, report_type),
     }
     
     return render(request, 'reports/reports.html', context)
@@ -3248,20 +2845,27 @@ def customer_payments(request, customer_id):
         return redirect('index')
     
     try:
-        customer = Customer.objects.get(id=customer_id)
+        customer = Customer.objects.select_related('ledger').get(id=customer_id)
         
-        # Get active items for this customer with optimized payment calculations
-        active_items = customer.items.filter(status='active').prefetch_related('payments').order_by('-purchase_date')
-        
-        # Calculate payment data for each item (optimized with prefetch)
+        # Get active items for this customer; payment totals come from the item ledgers
+        active_items = list(
+            customer.items.filter(status='active').select_related('ledger').order_by('-purchase_date')
+        )
+        item_totals = {item.id: item.ledger_summary.total_paid_with_rebates for item in active_items}
+        if customer.status != 'active':
+            # A closed contract's items may be archived - their ledgers went with them, so their
+            # totals come from the (archive-aware) customer summary
+            archived_items = list(customer.archived_items.filter(status='active'))
+            if archived_items:
+                summary_items = customer_summary(customer)['items']
+                for item in archived_items:
+                    item_totals[item.id] = summary_items.get(item.id, {}).get('total_paid_with_rebates', Decimal('0.00'))
+                active_items = sorted(active_items + archived_items, key=lambda item: item.purchase_date, reverse=True)
+        
+        # Calculate payment data for each item
         for item in active_items:
-            # Use prefetched payments to avoid additional queries
-            item_payments = item.payments.all()
-            
-            # Calculate total deductions toward this item's contract (payment + rebate)
-            total_deductions = Decimal('0.00')
-            for payment in item_payments:
-                total_deductions += payment.amount_paid + (payment.rebate_amount or Decimal('0.00'))
+            # Total deductions toward this item's contract (payment + rebate)
+            total_deductions = item_totals[item.id]
             
             # Item-specific payment data
             item.total_paid = total_deductions
@@ -3286,23 +2890,14 @@ def customer_payments(request, customer_id):
         
         customer.active_items = active_items
         
-        # Get all payments for this customer (for overall summary and breakdown)
-        # Order by payment_date and id to ensure a stable chronological order
-        payments = (
-            PaymentRecord.objects
-            .filter(customer=customer)
-            .select_related('customer_item')
-            .order_by('payment_date', 'id')
-        )
-        
-        # Calculate payment summary using REAL ITEM DATA (not old customer data)
-        total_paid = sum(payment.amount_paid for payment in payments)
-        total_paid_with_rebates = sum(payment.amount_paid + (payment.rebate_amount or 0) for payment in payments)
+        # Overall payment summary from the customer ledger - the payments themselves are
+        # fetched by the breakdown script from customer_payments_export
+        total_paid_with_rebates = customer.ledger_summary.total_paid_with_rebates
         
         # SMART FALLBACK: Use CustomerItem data if available, otherwise use clean Customer data
-        if active_items.exists():
+        if active_items:
             # Use the first active item's data (or sum all items if multiple)
-            first_item = active_items.first()
+            first_item = active_items[0]
             total_contract = first_item.monthly_due * first_item.term_months
             actual_term = first_item.term_months
         else:
@@ -3311,19 +2906,6 @@ def customer_payments(request, customer_id):
             total_contract = customer.monthly_due * customer.term
             actual_term = customer.term
             
-        # Calculate balance using running balance from payment records (like admin does)
-        # The admin shows PHP 6,549 as the final balance in the payment table
-        # This is the running balance after all payments and rebates
-        
-        # Get the final running balance from the last payment record
-        last_payment = payments.order_by('payment_date', 'id').last()
-        if last_payment and hasattr(last_payment, 'running_balance'):
-            # Use the running balance from the last payment record
-            balance = last_payment.running_balance
-        else:
-            # Fallback to calculation: Contract - (Payments + Rebates)
-            balance = total_contract - total_paid_with_rebates
-        
         # Ensure all customer items use correct calculated contract amounts
         # Fix any contract amount discrepancies in the database
         for active_item in active_items:
@@ -3333,8 +2915,8 @@ def customer_payments(request, customer_id):
                 active_item.save()
         
         # Recalculate total contract with corrected values
-        if active_items.exists():
-            first_item = active_items.first()
+        if active_items:
+            first_item = active_items[0]
             total_contract = first_item.monthly_due * first_item.term_months
         
         # Recalculate balance with corrected contract
@@ -3345,8 +2927,8 @@ def customer_payments(request, customer_id):
         term_for_summary = actual_term
 
         # Determine the monthly due used for the overall summary
-        if active_items.exists():
-            summary_monthly_due = active_items.first().monthly_due
+        if active_items:
+            summary_monthly_due = active_items[0].monthly_due
         else:
             summary_monthly_due = customer.monthly_due
 
@@ -3370,29 +2952,8 @@ def customer_payments(request, customer_id):
         # Create empty payment breakdown - will be populated by JavaScript when item is selected
         payment_breakdown = []
         
-        # Prepare payments data for JavaScript (universal for all customers)
-        import json
-        payments_json = []
-        for payment in payments:
-            payments_json.append({
-                'id': payment.id,
-                'customer_item_id': payment.customer_item.id if payment.customer_item else None,
-                'payment_date': payment.payment_date.strftime('%b %d, %Y'),
-                'amount_paid': float(payment.amount_paid),
-                'rebate_amount': float(payment.rebate_amount or 0),
-                'payment_method': payment.payment_method,
-                'transaction_number': payment.transaction_number or '',
-                'recorded_by': payment.recorded_by.username if payment.recorded_by else 'System',
-                'notes': payment.notes or '',
-                # New fields for showing time in payment breakdown
-                'created_at': payment.created_at.strftime('%b %d, %Y, %I:%M:%S %p') if payment.created_at else '',
-                'created_time': payment.created_at.strftime('%I:%M:%S %p') if payment.created_at else ''
-            })
-        
         context = {
             'customer': customer,
-            'payments': payments,
-            'payments_json': json.dumps(payments_json),  # Add JSON data for JavaScript
             'total_paid': total_paid_with_rebates,  # FIXED: Use rebate-inclusive total
             'total_contract': total_contract,
             'balance': balance,
@@ -3410,8 +2971,37 @@ def customer_payments(request, customer_id):
         return redirect('customers_list')
 
 
+@login_required
+def customer_payments_export(request, customer_id):
+    """Stream a customer's payment history, oldest first, as JSON (?format=json) or CSV.
 
-
+    ?item=<id> limits it to one item; add include_general=1 to keep the payments not linked
+    to any item. Staff can export any customer, customers only their own history.
+    """
+    if request.user.role not in ['admin', 'staff'] and request.user.customer_id != customer_id:
+        return JsonResponse({'success': False, 'error': 'Access denied'}, status=403)
+
+    customer = get_object_or_404(Customer, id=customer_id)
+    export_format = request.GET.get('format', 'json')
+    if export_format not in ('json', 'csv'):
+        return JsonResponse({'success': False, 'error': 'format must be json or csv'}, status=400)
+
+    # Live payments, plus the archived ones of a closed contract
+    payments = customer.payment_sources()
+    item_id = request.GET.get('item', '')
+    if item_id:
+        if not item_id.isdigit():
+            return JsonResponse({'success': False, 'error': 'Invalid item'}, status=400)
+        item_filter = Q(customer_item_id=int(item_id))
+        if request.GET.get('include_general') == '1':
+            item_filter |= Q(customer_item__isnull=True)
+        payments = [source.filter(item_filter) for source in payments]
+
+    if export_format == 'csv':
+        response = StreamingHttpResponse(stream_payments_csv(payments), content_type='text/csv')
+        response['Content-Disposition'] = f'attachment; filename="payments-{customer.id}.csv"'
+        return response
+    return StreamingHttpResponse(stream_payments_json(payments), content_type='application/json')
 
 def get_client_ip(request):
     """Get client IP address"""
@@ -64,6 +64,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so its timings cover the rest of the stack; inactive unless REQUEST_METRICS_ENABLED
+    'myapp.metrics.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -105,6 +107,26 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Local memory per process by default; point DJANGO_CACHE_BACKEND/DJANGO_CACHE_LOCATION at a shared
+# backend (e.g. django.core.cache.backends.redis.RedisCache, redis://host:6379/1) when running
+# several workers so cached summaries are invalidated for all of them.
+
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('DJANGO_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('DJANGO_CACHE_LOCATION', 'arjen-default'),
+        'TIMEOUT': 300,
+    }
+}
+
+# Request metrics (myapp.metrics) - per-view query counts and timings, off by default
+REQUEST_METRICS_ENABLED = os.environ.get('DJANGO_REQUEST_METRICS', 'False').lower() == 'true'
+REQUEST_METRICS_SLOW_MS = int(os.environ.get('DJANGO_REQUEST_METRICS_SLOW_MS', '1000'))
+REQUEST_METRICS_WINDOW = 500  # samples kept per URL name
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -0,0 +1,112 @@
+// Lazily loaded customer dropdowns.
+//
+// <select data-customer-picker="{% url 'customer_picker' %}"> gets a search box and fills
+// itself a page at a time from the customer_picker endpoint, instead of the page shipping
+// every active customer as an <option>. data-item-limit="3" shows "(n/3 items)" and
+// disables customers at the limit (Add Item form). Options carry data-name, data-address,
+// data-phone, data-items and data-monthly-due for the forms' existing change handlers.
+(function () {
+    const SEARCH_DELAY_MS = 250;
+
+    function buildOption(customer, itemLimit) {
+        const option = document.createElement('option');
+        option.value = customer.id;
+        option.dataset.name = customer.name;
+        option.dataset.address = customer.address;
+        option.dataset.phone = customer.contact;
+        option.dataset.items = customer.active_item_count;
+        option.dataset.monthlyDue = customer.monthly_due;
+        option.textContent = customer.name;
+
+        if (itemLimit) {
+            option.textContent += ` (${customer.active_item_count}/${itemLimit} items)`;
+            if (customer.active_item_count >= itemLimit) {
+                option.textContent += ' - LIMIT REACHED';
+                option.disabled = true;
+                option.style.color = '#dc3545';
+                option.style.background = '#f8d7da';
+            }
+        }
+        return option;
+    }
+
+    function enhance(select) {
+        select.dataset.pickerReady = '1';
+
+        const url = select.dataset.customerPicker;
+        const itemLimit = parseInt(select.dataset.itemLimit) || 0;
+        const placeholder = select.options[0] ? select.options[0].cloneNode(true) : null;
+        const loadMore = document.createElement('option');
+        loadMore.value = '';
+        loadMore.textContent = 'Load more customers...';
+
+        const search = document.createElement('input');
+        search.type = 'search';
+        search.placeholder = 'Search customers by name, contact or item...';
+        search.className = 'customer-picker-search';
+        search.style.width = '100%';
+        search.style.marginBottom = '0.5rem';
+        select.parentNode.insertBefore(search, select);
+
+        let query = '';
+        let nextCursor = '';
+        let request = 0;
+
+        function load(reset) {
+            const current = ++request;
+            const params = new URLSearchParams({ q: query, cursor: reset ? '' : nextCursor });
+
+            fetch(url + '?' + params.toString(), {
+                headers: { 'X-Requested-With': 'XMLHttpRequest' }
+            })
+            .then(response => response.json())
+            .then(data => {
+                // A newer search superseded this one
+                if (current !== request || !data.success) {
+                    return;
+                }
+                if (reset) {
+                    select.innerHTML = '';
+                    if (placeholder) {
+                        select.appendChild(placeholder.cloneNode(true));
+                    }
+                }
+                loadMore.remove();
+                data.results.forEach(customer => select.appendChild(buildOption(customer, itemLimit)));
+                nextCursor = data.next_cursor;
+                if (data.has_next) {
+                    select.appendChild(loadMore);
+                }
+            })
+            .catch(error => console.error('Error loading customers:', error));
+        }
+
+        select.addEventListener('change', function () {
+            if (select.options[select.selectedIndex] === loadMore) {
+                select.value = '';
+                load(false);
+            }
+        });
+
+        let timer = null;
+        search.addEventListener('input', function () {
+            clearTimeout(timer);
+            timer = setTimeout(function () {
+                query = search.value.trim();
+                load(true);
+            }, SEARCH_DELAY_MS);
+        });
+
+        load(true);
+    }
+
+    function enhanceAll() {
+        document.querySelectorAll('select[data-customer-picker]:not([data-picker-ready])').forEach(enhance);
+    }
+
+    document.addEventListener('DOMContentLoaded', function () {
+        enhanceAll();
+        // The Add Item modal is fetched and inserted after the page loaded
+        new MutationObserver(enhanceAll).observe(document.body, { childList: true, subtree: true });
+    });
+})();